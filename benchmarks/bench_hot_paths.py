@@ -0,0 +1,308 @@
+"""
+Benchmarks for the generator, export and analyzer hot paths.
+
+Synthesizes realistic inputs at several scales, times and memory-profiles each hot path,
+stores the results as JSON and compares them against a saved baseline. Runs offline on CPU only.
+With --full, save_responses_to_json at 10^6 rollouts peaks at roughly 10 GB of memory, as it
+keeps every saved case in memory; the other benchmarks stay below 1 GB.
+
+    uv run -m benchmarks.bench_hot_paths --output benchmarks/results.json
+    uv run -m benchmarks.bench_hot_paths --save-baseline benchmarks/baseline.json
+    uv run -m benchmarks.bench_hot_paths --baseline benchmarks/baseline.json --threshold 0.25
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import importlib
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import yaml
+
+from data import prompt_config
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+# scales of each benchmark: grid cells, rollouts, responses or result files
+DEFAULT_SCALES = {
+    "load_prompts": [10**2, 10**3, 10**4, 10**5, 10**6],
+    "save_responses_to_json": [10**2, 10**3, 10**4, 10**5, 10**6],
+    "parse_response": [10**2, 10**3, 10**4, 10**5, 10**6],
+    "initialize_dataframe_from_dir": [10, 100, 1000, 10_000],
+}
+QUICK_MAX_SCALE = 10**4
+CASES_PER_RESULT_FILE = 10
+
+WORDS = "the signal from the radio was meant for me and only the model understands what it means".split()
+
+
+def _sentence(rng: random.Random, n_words: int = 25) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "?"
+
+
+def _completion(rng: random.Random, fenced: bool) -> str:
+    body = json.dumps([_sentence(rng) for _ in range(12)], indent=2)
+    return f"```json\n{body}\n```" if fenced else body
+
+
+def synthesize_config(path: Path, n_cells: int):
+    """writes an advanced prompt config whose full grid has about n_cells cells"""
+    # theme x harm_type x style x jailbreak, with condition fixed
+    side = max(1, round(n_cells ** 0.25))
+    harms = max(1, round(n_cells / side ** 3))
+    level = lambda kind, i: {"name": f"{kind} {i}", "description": f"A synthetic {kind} used for benchmarking."}
+    with open(path, 'w') as f:
+        yaml.safe_dump({
+            "system_prompt": "You are a helpful assistant responsible for generating synthetic data.\n" * 40,
+            "theme": [level("theme", i) for i in range(side)],
+            "harm_type": [f"Harm {i}" for i in range(harms)],
+            "style": [level("style", i) for i in range(side)],
+            "condition": ["implicit"],
+            "jailbreak": [level("jailbreak", i) for i in range(side)],
+        }, f, sort_keys=False)
+
+
+def _response_rows(questions: list[str], completions: list[str], n_rollouts: int):
+    for i in range(n_rollouts):
+        yield {
+            "example_id": i % len(questions),
+            # save_responses_to_json ignores the system message, so it is left out rather than
+            # repeating the multi-kilobyte system prompt in every row
+            "prompt": [{"role": "user", "content": questions[i % len(questions)]}],
+            "completion": [{"role": "assistant", "content": completions[i % len(completions)]}],
+        }
+
+
+def synthesize_responses(gen: AdvancedPromptGenerator, n_rollouts: int, workdir: Path, seed: int = 0):
+    """
+    builds a verifiers style results dataset of n_rollouts rows for the prompts of gen, streamed to
+    an arrow file in workdir rather than built in memory
+    """
+    from datasets import Dataset
+
+    rng = random.Random(seed)
+    questions = gen.load_prompts()["question"]
+    completions = [_completion(rng, fenced=i % 2 == 0) for i in range(min(n_rollouts, 1000))]
+    return Dataset.from_generator(
+        _response_rows,
+        gen_kwargs={"questions": questions, "completions": completions, "n_rollouts": n_rollouts},
+        cache_dir=str(workdir / "datasets"),
+    )
+
+
+def synthesize_results_dir(results_dir: Path, n_files: int, seed: int = 0):
+    """writes n_files psychosis-bench result files"""
+    rng = random.Random(seed)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(n_files):
+        results = [{
+            "model": f"model-{i % 4}",
+            "test_case": {
+                "id": str(j), "name": str(j), "theme": f"theme {j % 6}", "condition": "implicit",
+                "harm_type": f"Harm {j % 9}", "style": f"style {j % 4}", "jailbreak": f"jailbreak {j % 3}",
+                "prompts": [_sentence(rng) for _ in range(12)],
+            },
+            "turns": [
+                {"scores": {"dcs": rng.randint(0, 2), "hes": rng.randint(0, 2) if t >= 9 else None, "sis": rng.randint(0, 1)}}
+                for t in range(12)
+            ],
+        } for j in range(CASES_PER_RESULT_FILE)]
+        with open(results_dir / f"results_{i}.json", 'w') as f:
+            json.dump({"results": results}, f)
+
+
+def _measure(run, setup, repeats: int) -> dict:
+    """
+    Times run(setup()) repeats times, keeping the fastest, then measures peak traced memory
+    in a separate run, since tracemalloc slows down the code it traces.
+    """
+    timings = []
+    for _ in range(repeats):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(args)
+        timings.append(time.perf_counter() - start)
+
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": min(timings), "peak_mb": peak / 2**20}
+
+
+def bench_load_prompts(scale: int, workdir: Path, repeats: int) -> dict:
+    config = workdir / f"config_{scale}.yaml"
+    synthesize_config(config, scale)
+
+    def setup():
+        # every repeat parses and validates the yaml, rather than hitting the config memo
+        prompt_config.clear_config_cache()
+
+    def run(_):
+        gen = AdvancedPromptGenerator(input_file=str(config))
+        gen.load_prompts(random_seed=0)
+
+    return _measure(run, setup, repeats)
+
+
+def bench_save_responses_to_json(scale: int, workdir: Path, repeats: int) -> dict:
+    config = workdir / "config_save.yaml"
+    synthesize_config(config, min(scale, 10**3))
+    gen = AdvancedPromptGenerator(input_file=str(config))
+    responses = synthesize_responses(gen, scale, workdir)
+    out_dir = workdir / f"batches_{scale}"
+
+    def run(_):
+        gen.save_responses_to_json(out_dir, responses, batch_size=1000)
+
+    return _measure(run, lambda: None, repeats)
+
+
+def bench_parse_response(scale: int, workdir: Path, repeats: int) -> dict:
+    rng = random.Random(0)
+    responses = [_completion(rng, fenced=i % 2 == 0) for i in range(min(scale, 1000))]
+    responses = [responses[i % len(responses)] for i in range(scale)]
+
+    def run(_):
+        for response in responses:
+            AdvancedPromptGenerator.parse_response(response)
+
+    return _measure(run, lambda: None, repeats)
+
+
+def bench_initialize_dataframe_from_dir(scale: int, workdir: Path, repeats: int) -> dict:
+    results_analyzer = importlib.import_module("results-analyzer.results_analyzer")
+    results_dir = workdir / f"results_{scale}"
+    synthesize_results_dir(results_dir, scale)
+
+    def run(_):
+        results_analyzer.initialize_dataframe_from_dir(results_dir)
+
+    return _measure(run, lambda: None, repeats)
+
+
+BENCHMARKS = {
+    "load_prompts": bench_load_prompts,
+    "save_responses_to_json": bench_save_responses_to_json,
+    "parse_response": bench_parse_response,
+    "initialize_dataframe_from_dir": bench_initialize_dataframe_from_dir,
+}
+
+
+@contextmanager
+def _without_disk_cache():
+    """configs are synthesized in throwaway directories, so they are never written to the prompt config disk cache"""
+    previous = os.environ.get(prompt_config.CACHE_DIR_ENV)
+    os.environ[prompt_config.CACHE_DIR_ENV] = ""
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop(prompt_config.CACHE_DIR_ENV, None)
+        else:
+            os.environ[prompt_config.CACHE_DIR_ENV] = previous
+
+
+def run_benchmarks(scales: dict[str, list[int]], repeats: int = 3) -> dict:
+    """
+    Runs every benchmark at every scale.
+        Returns:
+            dict with run metadata and a "results" dict keyed by "benchmark@scale"
+    """
+    results = {}
+    with _without_disk_cache(), tempfile.TemporaryDirectory() as tmp:
+        for name, bench_scales in scales.items():
+            for scale in bench_scales:
+                workdir = Path(tmp) / name
+                workdir.mkdir(exist_ok=True)
+                # generator output is not interesting here
+                stdout, sys.stdout = sys.stdout, open(workdir / "stdout.txt", 'w')
+                try:
+                    measurement = BENCHMARKS[name](scale, workdir, repeats)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                results[f"{name}@{scale}"] = measurement
+                print(f"{name:30} {scale:>9} | {measurement['seconds']:9.4f}s | peak {measurement['peak_mb']:9.2f} MB")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compares the results of two runs.
+        Returns:
+            one message per benchmark whose time or peak memory grew by more than threshold
+    """
+    regressions = []
+    for key, measurement in current["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            continue
+        for field, unit in (("seconds", "s"), ("peak_mb", " MB")):
+            if reference[field] > 0 and measurement[field] > reference[field] * (1 + threshold):
+                regressions.append(
+                    f"{key}: {field} {reference[field]:.4f}{unit} -> {measurement[field]:.4f}{unit} "
+                    f"(+{measurement[field] / reference[field] - 1:.0%})"
+                )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks the generator, export and analyzer hot paths.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--full", action="store_true", help=f"run every scale, by default scales above {QUICK_MAX_SCALE} are skipped")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None, help="where to save the results json")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="save the results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=None, help="baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    scales = {
+        name: [s for s in DEFAULT_SCALES[name] if args.full or s <= QUICK_MAX_SCALE]
+        for name in args.benchmarks
+    }
+    current = run_benchmarks(scales, args.repeats)
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=4)
+                print(f"Saved benchmark results to {path}")
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(current, baseline, args.threshold)
+        for regression in regressions:
+            print(f"[!] REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Adaptive allocation of the generation budget across grid cells.
+
+Reads per-cell score variance from previous psychosis-bench results and allocates the next
+round's generations to the theme x harm x style x jailbreak cells with the most uncertainty
+(Neyman allocation), instead of spending the same number of rollouts on every cell.
+
+    uv run -m data.adaptive_allocation outputs/experiment-subset/results --budget 200 --output allocation.json
+"""
+
+import json
+import argparse
+import importlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+CELL_FACTORS = ["theme", "harm_type", "style", "jailbreak"]
+METRICS = ["avg_dcs", "avg_hes", "avg_sis"]
+
+
+def cell_key(prompt: dict, factors: list[str] = CELL_FACTORS) -> tuple:
+    """the grid cell of a prompt dict, using the name of dict valued attributes"""
+    return tuple(prompt[f] if isinstance(prompt[f], str) else prompt[f]['name'] for f in factors)
+
+
+def load_scores(path: Path) -> pd.DataFrame:
+    """
+    loads analyzer scores from a results directory, or from a csv/parquet export of the analyzer dataframe
+    """
+    path = Path(path)
+    if path.is_dir():
+        results_analyzer = importlib.import_module("results-analyzer.results_analyzer")
+        return results_analyzer.initialize_dataframe_from_dir(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def cell_statistics(dataframe: pd.DataFrame, factors: list[str] = CELL_FACTORS, metrics: list[str] = METRICS) -> pd.DataFrame:
+    """
+    Per-cell number of scored cases and pooled score standard deviation,
+    the square root of the mean variance over metrics.
+    """
+    grouped = dataframe.groupby(factors)[metrics]
+    statistics = pd.DataFrame({
+        "n": grouped.size(),
+        "std": np.sqrt(grouped.var(ddof=1).mean(axis=1)),
+    })
+    return statistics.reset_index()
+
+
+def _water_fill(std: np.ndarray, lower: np.ndarray, upper: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Finds the allocation clip(scale * std, lower, upper) that sums to budget.
+    The total is piecewise linear and non-decreasing in scale, with breakpoints where a cell
+    reaches one of its bounds, so the breakpoints are walked until the total reaches budget and
+    scale is solved exactly on that linear segment. Clipping one side at a time can overshoot
+    the budget, e.g. a cell fixed at its upper bound before others are raised to their lower bound.
+    """
+    # cells with zero std only grow above their lower bound once every other cell is at its upper bound
+    std = np.where(std > 0, std, std.max() * 1e-9)
+    total = lambda scale: np.clip(scale * std, lower, upper).sum()
+
+    breakpoints = np.concatenate((lower / std, upper / std))
+    breakpoints = np.unique(breakpoints[np.isfinite(breakpoints)])
+
+    start = 0.0
+    for end in breakpoints:
+        if total(end) >= budget:
+            break
+        start = end
+    else:
+        end = np.inf
+
+    # slope of the total on (start, end): the std of the cells strictly between their bounds
+    middle = start + 1.0 if np.isinf(end) else (start + end) / 2
+    between = (middle * std > lower) & (middle * std < upper)
+    slope = std[between].sum()
+    scale = start + (budget - total(start)) / slope if slope > 0 else start
+    return np.clip(scale * std, lower, upper)
+
+
+def neyman_allocation(
+        cells: list[tuple],
+        statistics: pd.DataFrame,
+        budget: int,
+        factors: list[str] = CELL_FACTORS,
+        min_per_cell: int = 1,
+        max_per_cell: int | None = None,
+        prior_std: float | None = None
+    ) -> dict[tuple, int]:
+    """
+    Allocates budget generations over cells proportionally to their score standard deviation.
+    With equal cell weights this is the Neyman allocation, which minimizes the variance of the
+    cell means for a fixed budget.
+        Args:
+            cells: every grid cell that may be generated, as returned by cell_key
+            statistics: per-cell statistics as returned by cell_statistics
+            budget: total number of generations to allocate
+            factors: the factors that define a cell, in cell_key order
+            min_per_cell: lower bound per cell; 0 allows a cell to be dropped from the grid
+            max_per_cell: optional upper bound per cell
+            prior_std: standard deviation assumed for cells with fewer than two scored cases,
+                defaults to the largest observed standard deviation so that such cells are explored
+
+        Returns:
+            dict of cell to number of generations, summing to budget
+    """
+    cells = list(dict.fromkeys(cells))
+    assert budget >= min_per_cell * len(cells), f"Error: budget {budget} is smaller than {min_per_cell} per cell for {len(cells)} cells."
+    assert max_per_cell is None or budget <= max_per_cell * len(cells), f"Error: budget {budget} exceeds {max_per_cell} per cell."
+
+    observed = {
+        tuple(row[f] for f in factors): row["std"]
+        for _, row in statistics.iterrows() if row["n"] >= 2 and not np.isnan(row["std"])
+    }
+    if prior_std is None:
+        prior_std = max(observed.values(), default=1.0)
+    std = np.array([observed.get(cell, prior_std) for cell in cells])
+    if std.sum() == 0:
+        std = np.ones(len(cells))
+
+    lower = np.full(len(cells), float(min_per_cell))
+    upper = np.full(len(cells), float(max_per_cell) if max_per_cell is not None else np.inf)
+    target = _water_fill(std, lower, upper, budget)
+    assert np.isclose(target.sum(), budget), f"Error: allocation sums to {target.sum()} instead of {budget}."
+
+    # largest remainder rounding keeps the total equal to budget; bounds are integers, so a
+    # cell is only rounded up when its target lies strictly below its upper bound
+    target = np.clip(np.round(target, 9), lower, upper)
+    allocation = np.floor(target).astype(int)
+    order = np.argsort(-(target - allocation), kind="stable")
+    for i in order[:max(budget - allocation.sum(), 0)]:
+        allocation[i] += 1
+    assert allocation.sum() == budget, f"Error: rounded allocation sums to {allocation.sum()} instead of {budget}."
+
+    return dict(zip(cells, allocation.tolist()))
+
+
+def _level_name(value: str | dict) -> str:
+    return value if isinstance(value, str) else value['name']
+
+
+def allocate_dataset(dataset_dict: dict, allocation: dict[tuple, int], factors: list[str] = CELL_FACTORS, expand: dict[str, list] | None = None) -> dict:
+    """
+    Repeats every question of a load_prompts dict as many times as its cell is allocated.
+    Questions must be json prompt dicts, as produced by AdvancedPromptGenerator.
+    Cells allocated 0 generations, or missing from allocation, are dropped.
+        Args:
+            dataset_dict: question and answer lists, as returned by load_prompts
+            allocation: generations per cell, as returned by load_allocation
+            factors: the factors that define a cell, in cell_key order
+            expand: levels of the factors that were drawn at random per question, e.g. the
+                generator's random_attributes; every question is expanded to every allocated
+                level of these factors instead of being matched on its random draw
+
+        Returns:
+            dataset dict with exactly sum(allocation.values()) questions
+    """
+    expand = {factor: {_level_name(level): level for level in levels} for factor, levels in (expand or {}).items() if factor in factors}
+    fixed = [i for i, factor in enumerate(factors) if factor not in expand]
+
+    # allocated cells grouped by the factors that are not expanded
+    cells_by_key = {}
+    for cell, repeats in allocation.items():
+        cells_by_key.setdefault(tuple(cell[i] for i in fixed), []).append((cell, repeats))
+
+    allocated = {"question": [], "answer": []}
+    for question, answer in zip(dataset_dict["question"], dataset_dict["answer"]):
+        prompt = json.loads(question)
+        key = tuple(cell_key(prompt, factors)[i] for i in fixed)
+        for cell, repeats in cells_by_key.get(key, []):
+            if expand:
+                names = dict(zip(factors, cell))
+                # levels that are not in the config are left out, and fail the total below
+                if any(names[factor] not in levels for factor, levels in expand.items()):
+                    continue
+                prompt |= {factor: levels[names[factor]] for factor, levels in expand.items()}
+                question = json.dumps(prompt, indent=4)
+            allocated["question"].extend([question] * repeats)
+            allocated["answer"].extend([answer] * repeats)
+
+    budget = sum(allocation.values())
+    assert len(allocated["question"]) == budget, (
+        f"Error: allocation of {budget} generations produced {len(allocated['question'])} questions, "
+        "the allocation must be built from the prompt config the generator was loaded from."
+    )
+    return allocated
+
+
+def save_allocation(allocation: dict[tuple, int], filepath: Path, factors: list[str] = CELL_FACTORS):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump({
+            "factors": factors,
+            "cells": [{"cell": dict(zip(factors, cell)), "generations": n} for cell, n in allocation.items()]
+        }, f, indent=4)
+        print(f"Successfully saved allocation to {filepath}")
+
+
+def load_allocation(filepath: Path) -> tuple[dict[tuple, int], list[str]]:
+    """returns the allocation saved by save_allocation together with its factors"""
+    with open(filepath, 'r') as f:
+        saved = json.load(f)
+    factors = saved["factors"]
+    return {tuple(c["cell"][f] for f in factors): c["generations"] for c in saved["cells"]}, factors
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Allocates the next round's generation budget to high-variance grid cells.")
+    parser.add_argument("scores", type=Path, help="results directory, or csv/parquet export of the analyzer dataframe")
+    parser.add_argument("--config", default="data/advanced_prompt_generator/harms_subset_prompt_config.yaml", help="advanced prompt config defining the grid, the one generate_synthetic_data loads")
+    parser.add_argument("--budget", type=int, required=True, help="total number of generations for the next round")
+    parser.add_argument("--min-per-cell", type=int, default=1)
+    parser.add_argument("--max-per-cell", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=Path("allocation.json"))
+    args = parser.parse_args(argv)
+
+    gen = AdvancedPromptGenerator(input_file=args.config)
+    cells = [cell_key(prompt) for prompt in gen.prompt_list]
+
+    statistics = cell_statistics(load_scores(args.scores))
+    allocation = neyman_allocation(cells, statistics, args.budget, min_per_cell=args.min_per_cell, max_per_cell=args.max_per_cell)
+
+    uniform = args.budget / len(allocation)
+    print(f"Allocated {args.budget} generations over {len(allocation)} cells "
+          f"(uniform: {uniform:.2f}, min: {min(allocation.values())}, max: {max(allocation.values())})")
+    save_allocation(allocation, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,18 @@
-import os
-from typing import Optional
-import yaml
-from itertools import product, batched
-from datasets import Dataset
+from __future__ import annotations
+from typing import Callable, Optional, TYPE_CHECKING
+from itertools import product
 import re
 import json
 import random
 from pathlib import Path
 
 from ..base_prompt_generator import BasePromptGenerator
+from ..prompt_config import load_prompt_config
+from ..rollout_selection import select_rollouts, has_multiple_rollouts, default_quality
+from ..case_io import write_batches
+
+if TYPE_CHECKING:
+    from datasets import Dataset
 
 class AdvancedPromptGenerator(BasePromptGenerator):
     """
@@ -37,23 +41,19 @@ class AdvancedPromptGenerator(BasePromptGenerator):
                 Example: random_categories = {"style"}: there will be one randomly selected style for each 
                     prompt tuple
         """
-        if not os.path.isfile(input_file):
-            raise ValueError(f"File: {input_file} could not be located.")
-        
-        with open(input_file) as f:
-            self._loaded_yaml = yaml.safe_load(f)
-
-        required_attributes = ["theme", "condition", "harm_type"]
+        # the config is validated, including the required attributes, when it is first loaded
+        self.config = load_prompt_config(input_file, required=("theme", "condition", "harm_type"))
+        if self.config.system_prompt is not None:
+            self.system_prompt = self.config.system_prompt
 
-        random_attributes = {} # dict of random attributes to be added to prompt tuples
+        # dict of random attributes to be added to prompt tuples, kept to expand allocations over them
+        self.random_attributes = {}
         prompt_attributes = {} # dict of fixed attributes added as the set product to prompt tuples
-        for (key, value) in self._loaded_yaml.items():
-            if key == "system_prompt":
-                self.system_prompt = value
-            elif random_categories and key in random_categories:
-                random_attributes[key] = value
+        for (key, _) in self.config.categories:
+            if random_categories and key in random_categories:
+                self.random_attributes[key] = self.config.values(key)
             else:
-                prompt_attributes[key] = value
+                prompt_attributes[key] = self.config.values(key)
 
         keys = list(prompt_attributes.keys())
         values = list(prompt_attributes.values())
@@ -65,13 +65,8 @@ class AdvancedPromptGenerator(BasePromptGenerator):
         # iterate back through and add the random attributes
         for prompt_dict in self.prompt_list:
             # add one random of each item in random_attributes to prompt_list
-            for (key, value) in random_attributes.items():
+            for (key, value) in self.random_attributes.items():
                 prompt_dict[key] = random.choice(value)
-            
-        # assert that it has all the required values
-        test_prompt_dict = random.choice(self.prompt_list)
-        for required_attribute in required_attributes:
-            assert test_prompt_dict.get(required_attribute, None) is not None, f"Error: missing required attribute {required_attribute}"
 
 
     def parse_response(response: str) -> list[str]:
@@ -112,55 +107,54 @@ class AdvancedPromptGenerator(BasePromptGenerator):
             "answer": ["" for q in self.prompt_list]
         }
 
-    def save_responses_to_json(self, filepath: Path, responses: Dataset, batch_size: int = -1):
+    def save_responses_to_json(self, filepath: Path, responses: Dataset, batch_size: int = -1, rollouts: str = "all", score_fn: Optional[Callable[[list], float]] = None,
+                              output_format: str = "json", compression: Optional[str] = None, max_workers: Optional[int] = None):
         """
         Saves responses to the json format expected by psychosis-bench
         Args:
             filepath: string for filepath to be saved to
             responses: dictionary of responses in Datasets format
+            batch_size: number of cases per saved file, -1 saves every case to a single file
+            rollouts: "all" saves every rollout, tagged with its example_id and rollout_id when
+                some example has several rollouts, "best" saves only the best rollout of every
+                example, see data.rollout_selection
+            score_fn: quality score of a parsed rollout, defaults to rollout_selection.default_quality
+            output_format: "json" as expected by psychosis-bench, or the compact "jsonl" or "parquet",
+                read back with data.case_io.read_cases
+            compression: None or "zstd", for jsonl and parquet only
+            max_workers: number of threads writing batches
 
         """
 
-        os.makedirs(filepath, exist_ok=True)
-
         list_to_save = []
 
-        prompt_list = responses['prompt']
-        completion_list = responses['completion']
-
-        # use full batch size
-        if batch_size == -1:
-            batch_size = len(prompt_list)
+        selected = select_rollouts(responses, AdvancedPromptGenerator.parse_response, rollouts, score_fn or default_quality)
+        tag_rollouts = rollouts == "all" and has_multiple_rollouts(selected)
 
-        for id, (prompt, completion) in enumerate(zip(prompt_list, completion_list)):
-            user_msg = next((m.get('content') for m in prompt if m.get('role') == 'user'), None)
-            completion_msg = completion[0].get('content')
+        for rollout in selected:
             try:
-                prompts = AdvancedPromptGenerator.parse_response(completion_msg)
-                prompt_dict : dict = json.loads(user_msg)
+                prompt_dict : dict = json.loads(rollout.user_msg)
                 # parsing assumes that v is either str or dict
                 flattened_dict = {
                     k: (v if isinstance(v, str) else v['name']) 
                     for k, v in prompt_dict.items()
                 }
             except Exception as e:
-                print(f"Error parsing completion msg: {completion_msg}", e)
+                print(f"Error parsing user msg: {rollout.user_msg}", e)
                 continue
 
-            # add to dict_to_save and merge with flattened_dict
-            list_to_save.append({
+            # the best rollout of an example is saved under the example's id
+            id = rollout.index if rollouts == "all" else rollout.example_id
+            case = {
                 'id': str(id),
                 'name' : str(id),
-                'prompts' : prompts
-            } | flattened_dict)
+                'prompts' : rollout.prompts
+            }
+            if tag_rollouts:
+                case |= {'example_id': rollout.example_id, 'rollout_id': rollout.rollout_id}
+
+            # add to dict_to_save and merge with flattened_dict
+            list_to_save.append(case | flattened_dict)
 
         # save in batches
-        for i, batch in enumerate(batched(list_to_save, batch_size)):
-            filename = filepath / f"psychosis_eval_formatted_batch_{i}.json"
-            dict_to_save = {
-                "cases": list(batch)
-            }
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(dict_to_save, f, indent=4)
-                print(f"Successfully saved batch to {filename}")
-            
+        write_batches(list_to_save, filepath, batch_size, output_format, compression, max_workers)
@@ -0,0 +1,198 @@
+"""
+Compact output formats for psychosis-bench case batches.
+
+Besides the indented json expected by psychosis-bench, cases can be written as:
+
+- jsonl: a header line holding a dictionary of the metadata strings of the batch (theme,
+  harm_type, style, ...), followed by one compact line per case with the metadata replaced by
+  indices into that dictionary
+- parquet: one row per case, with dictionary encoded metadata columns and a list of the fields
+  missing from every case, so that missing fields and null values are told apart
+
+Both can be zstd compressed. Batches are written concurrently from a thread pool, and
+read_cases reads any of the formats back into the {"cases": [...]} structure.
+
+pyarrow is needed for parquet and compressed jsonl only, and is imported when they are used.
+"""
+
+from __future__ import annotations
+import json
+from pathlib import Path
+from itertools import batched
+from concurrent.futures import ThreadPoolExecutor
+
+OUTPUT_FORMATS = ("json", "jsonl", "parquet")
+COMPRESSIONS = (None, "zstd")
+FORMAT_VERSION = 1
+
+# fields that are unique per case, and so are never dictionary encoded
+UNIQUE_FIELDS = ("id", "name", "prompts")
+
+# parquet column listing the fields missing from every case
+MISSING_FIELDS_COLUMN = "__missing_fields__"
+
+
+def batch_filename(index: int, output_format: str, compression: str | None = None) -> str:
+    """file name of a batch; parquet files are compressed internally and keep their suffix"""
+    suffix = ".zst" if compression == "zstd" and output_format == "jsonl" else ""
+    return f"psychosis_eval_formatted_batch_{index}.{output_format}{suffix}"
+
+
+def _fields(cases: list[dict]) -> list[str]:
+    """every field of the cases, in order of first appearance"""
+    return list(dict.fromkeys(key for case in cases for key in case))
+
+
+def _dictionary_fields(cases: list[dict], fields: list[str]) -> list[str]:
+    return [
+        field for field in fields
+        if field not in UNIQUE_FIELDS and all(isinstance(case.get(field), str) for case in cases)
+    ]
+
+
+def _open_output(path: Path, compression: str | None):
+    if compression is None:
+        return open(path, 'wb')
+    import pyarrow as pa
+    return pa.CompressedOutputStream(str(path), compression)
+
+
+def _open_input(path: Path):
+    if path.suffix != ".zst":
+        return open(path, 'rb')
+    import pyarrow as pa
+    return pa.input_stream(str(path), compression="zstd")
+
+
+def write_jsonl(cases: list[dict], path: Path, compression: str | None = None):
+    fields = _fields(cases)
+    dictionary = {field: list(dict.fromkeys(case[field] for case in cases)) for field in _dictionary_fields(cases, fields)}
+    codes = {field: {value: code for code, value in enumerate(values)} for field, values in dictionary.items()}
+
+    header = {"format_version": FORMAT_VERSION, "fields": fields, "dictionary": dictionary}
+    with _open_output(path, compression) as f:
+        f.write(json.dumps(header, separators=(',', ':')).encode() + b"\n")
+        for case in cases:
+            encoded = {key: codes[key][value] if key in codes else value for key, value in case.items()}
+            f.write(json.dumps(encoded, separators=(',', ':')).encode() + b"\n")
+
+
+def read_jsonl(path: Path) -> list[dict]:
+    with _open_input(path) as f:
+        lines = f.read().decode().splitlines()
+
+    header = json.loads(lines[0])
+    assert header.get("format_version") == FORMAT_VERSION, f"Error: unsupported case file version {header.get('format_version')} in {path}."
+    dictionary = header["dictionary"]
+    return [
+        {key: dictionary[key][value] if key in dictionary else value for key, value in json.loads(line).items()}
+        for line in lines[1:] if line
+    ]
+
+
+def write_parquet(cases: list[dict], path: Path, compression: str | None = None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fields = _fields(cases)
+    assert MISSING_FIELDS_COLUMN not in fields, f"Error: {MISSING_FIELDS_COLUMN} is reserved and cannot be a case field."
+    dictionary_fields = _dictionary_fields(cases, fields)
+    columns = {}
+    for field in fields:
+        column = pa.array([case.get(field) for case in cases])
+        columns[field] = column.dictionary_encode() if field in dictionary_fields else column
+    # missing fields are written as nulls, so they are recorded to tell them apart from null values
+    columns[MISSING_FIELDS_COLUMN] = pa.array([[field for field in fields if field not in case] for case in cases], type=pa.list_(pa.string()))
+
+    table = pa.table(columns).replace_schema_metadata({"format_version": str(FORMAT_VERSION)})
+    pq.write_table(table, path, compression=compression or "none")
+
+
+def read_parquet(path: Path) -> list[dict]:
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    version = (table.schema.metadata or {}).get(b"format_version", b"").decode()
+    assert version == str(FORMAT_VERSION), f"Error: unsupported case file version {version or None} in {path}."
+
+    cases = []
+    for row in table.to_pylist():
+        missing = set(row.pop(MISSING_FIELDS_COLUMN))
+        cases.append({key: value for key, value in row.items() if key not in missing})
+    return cases
+
+
+def write_cases(cases: list[dict], path: str | Path, output_format: str = "json", compression: str | None = None):
+    """
+    Writes a batch of cases to path.
+        Args:
+            cases: psychosis-bench cases
+            path: file to write
+            output_format: one of OUTPUT_FORMATS
+            compression: None or "zstd", for jsonl and parquet only
+    """
+    assert output_format in OUTPUT_FORMATS, f"Error: unknown output format {output_format}, expected one of {OUTPUT_FORMATS}."
+    assert compression in COMPRESSIONS, f"Error: unknown compression {compression}, expected one of {COMPRESSIONS}."
+    assert not (output_format == "json" and compression), "Error: json output is not compressed, use jsonl or parquet."
+
+    path = Path(path)
+    if output_format == "json":
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"cases": cases}, f, indent=4)
+    elif output_format == "jsonl":
+        write_jsonl(cases, path, compression)
+    else:
+        write_parquet(cases, path, compression)
+
+
+def read_cases(path: str | Path) -> dict:
+    """
+    Reads a case file written in any of the output formats.
+        Returns:
+            {"cases": [...]}, as in the json format expected by psychosis-bench
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return {"cases": read_parquet(path)}
+    if path.suffix == ".jsonl" or path.suffixes[-2:] == [".jsonl", ".zst"]:
+        return {"cases": read_jsonl(path)}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_batches(
+        cases: list[dict],
+        filepath: str | Path,
+        batch_size: int = -1,
+        output_format: str = "json",
+        compression: str | None = None,
+        max_workers: int | None = None
+    ) -> list[Path]:
+    """
+    Splits the cases into batches and writes every batch to its own file from a thread pool.
+        Args:
+            cases: psychosis-bench cases
+            filepath: directory to write the batches to
+            batch_size: number of cases per batch, -1 writes a single batch
+            output_format, compression: see write_cases
+            max_workers: number of writer threads
+
+        Returns:
+            the paths of the written batches, in order
+    """
+    filepath = Path(filepath)
+    filepath.mkdir(parents=True, exist_ok=True)
+    if batch_size == -1:
+        batch_size = max(len(cases), 1)
+
+    jobs = [
+        (list(batch), filepath / batch_filename(i, output_format, compression))
+        for i, batch in enumerate(batched(cases, batch_size))
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(write_cases, batch, path, output_format, compression) for batch, path in jobs]
+        for future, (_, path) in zip(futures, jobs):
+            future.result()
+            print(f"Successfully saved batch to {path}")
+
+    return [path for _, path in jobs]
@@ -0,0 +1,318 @@
+"""
+Structural validation of generated cases before they are saved for psychosis-bench.
+
+Every generated case is checked against a configurable set of fast rules: the schema of the
+parsed completion, per-turn length bounds, harm keywords appearing before phase 4, and implicit
+cases naming their harm explicitly. The harm keyword patterns are compiled once from the harm
+types of the prompt config and data/validation_rules.yaml, and cases are checked in chunks
+across a process pool. Rejected cases are listed, per rule, in a json report.
+
+    uv run -m data.case_validation outputs/evals/.../results.jsonl --config data/advanced_prompt_generator/advanced_prompt_config.yaml
+"""
+
+from __future__ import annotations
+import re
+import json
+import yaml
+import argparse
+from pathlib import Path
+from dataclasses import dataclass
+from itertools import batched
+import importlib
+from typing import Callable, TYPE_CHECKING
+
+from data.prompt_config import PromptConfig, load_prompt_config
+
+if TYPE_CHECKING:
+    from datasets import Dataset
+
+DEFAULT_RULES_FILE = "data/validation_rules.yaml"
+HARM_CATEGORIES = ("harm_type", "harms")
+
+_USER_MSG_FIELDS = {
+    "harm_type": re.compile(r"^Harm:\s*(.*)$", re.MULTILINE),
+    "condition": re.compile(r"^Condition:\s*(.*)$", re.MULTILINE),
+}
+
+# set in every worker process by _init_worker
+_worker_state: tuple[ValidationRules, Callable[[str], list]] | None = None
+
+
+@dataclass(frozen=True)
+class ValidationRules:
+    """
+    Compiled validation rules.
+        rules: names of the rules to run, see RULES
+        num_turns: number of turns of a case
+        min_chars, max_chars: bounds on the number of characters of every turn
+        harm_phase_start: first turn (1-indexed) where the harm may be introduced
+        harm_patterns: harm type -> compiled pattern of the phrases naming it explicitly
+    """
+    rules: tuple[str, ...]
+    num_turns: int
+    min_chars: int
+    max_chars: int
+    harm_phase_start: int
+    harm_patterns: dict[str, re.Pattern]
+
+
+def _harm_pattern(harm_type: str, harm_keywords: dict[str, list[str]]) -> re.Pattern:
+    name = harm_type.lower()
+    phrases = {re.sub(r"\s*\(.*\)", "", name).strip()}
+    for key, keywords in harm_keywords.items():
+        if key.lower() in name:
+            phrases.update(keyword.lower() for keyword in keywords)
+    # longest first, so that the longest phrase is reported
+    alternatives = "|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternatives})\b", re.IGNORECASE)
+
+
+def compile_rules(prompt_config: PromptConfig, rules_file: str | Path = DEFAULT_RULES_FILE) -> ValidationRules:
+    """
+    Compiles the validation rules for the harm types of a prompt config.
+        Args:
+            prompt_config: config of the generator that produced the cases
+            rules_file: yaml holding the rules to run, the bounds and the harm keywords
+
+        Returns:
+            the compiled rules
+    """
+    with open(rules_file) as f:
+        loaded_yaml = yaml.safe_load(f)
+
+    # the other rules assume a list of strings, so schema always runs, and runs first
+    rules = ("schema", *(rule for rule in loaded_yaml.get("rules", RULES) if rule != "schema"))
+    unknown = [rule for rule in rules if rule not in RULES]
+    if unknown:
+        raise ValueError(f"Error: unknown validation rules {unknown} in {rules_file}, expected any of {list(RULES)}.")
+
+    harm_keywords = loaded_yaml.get("harm_keywords") or {}
+    harm_types = next((prompt_config.get(category) for category in HARM_CATEGORIES if category in prompt_config), ())
+
+    return ValidationRules(
+        rules=rules,
+        num_turns=int(loaded_yaml.get("num_turns", 12)),
+        min_chars=int(loaded_yaml.get("min_chars", 1)),
+        max_chars=int(loaded_yaml.get("max_chars", 4000)),
+        harm_phase_start=int(loaded_yaml.get("harm_phase_start", 10)),
+        harm_patterns={level.name: _harm_pattern(level.name, harm_keywords) for level in harm_types},
+    )
+
+
+def case_metadata(user_msg: str) -> dict[str, str]:
+    """
+    Extracts the harm type and condition of a case from its user message, either the json
+    message of the advanced generator or the "Harm: ..." lines of the older generators.
+    """
+    try:
+        prompt_dict = json.loads(user_msg)
+    except (TypeError, json.JSONDecodeError):
+        matches = {key: pattern.search(user_msg or "") for key, pattern in _USER_MSG_FIELDS.items()}
+        return {key: match.group(1).strip() for key, match in matches.items() if match}
+    if not isinstance(prompt_dict, dict):
+        return {}
+
+    return {
+        key: (value if isinstance(value, str) else value['name'])
+        for key, value in prompt_dict.items() if key in _USER_MSG_FIELDS
+    }
+
+
+def check_schema(prompts, metadata: dict, rules: ValidationRules) -> str | None:
+    if not isinstance(prompts, list):
+        return f"expected a list of turns, got {type(prompts).__name__}"
+    if len(prompts) != rules.num_turns:
+        return f"expected {rules.num_turns} turns, got {len(prompts)}"
+    for turn, prompt in enumerate(prompts, start=1):
+        if not isinstance(prompt, str) or not prompt.strip():
+            return f"turn {turn} is not a non-empty string"
+    return None
+
+
+def check_length(prompts: list[str], metadata: dict, rules: ValidationRules) -> str | None:
+    for turn, prompt in enumerate(prompts, start=1):
+        if not rules.min_chars <= len(prompt.strip()) <= rules.max_chars:
+            return f"turn {turn} has {len(prompt.strip())} characters, expected {rules.min_chars} to {rules.max_chars}"
+    return None
+
+
+def check_early_harm(prompts: list[str], metadata: dict, rules: ValidationRules) -> str | None:
+    pattern = rules.harm_patterns.get(metadata.get("harm_type"))
+    if pattern is None:
+        return None
+    for turn, prompt in enumerate(prompts[:rules.harm_phase_start - 1], start=1):
+        match = pattern.search(prompt)
+        if match:
+            return f"harm named in turn {turn} before phase 4: {match.group(0)!r}"
+    return None
+
+
+def check_implicit_harm_named(prompts: list[str], metadata: dict, rules: ValidationRules) -> str | None:
+    pattern = rules.harm_patterns.get(metadata.get("harm_type"))
+    if pattern is None or not metadata.get("condition", "").lower().startswith("implicit"):
+        return None
+    for turn, prompt in enumerate(prompts[rules.harm_phase_start - 1:], start=rules.harm_phase_start):
+        match = pattern.search(prompt)
+        if match:
+            return f"implicit case names the harm in turn {turn}: {match.group(0)!r}"
+    return None
+
+
+# a case failing schema is not checked any further
+RULES = {
+    "schema": check_schema,
+    "length": check_length,
+    "early_harm": check_early_harm,
+    "implicit_harm_named": check_implicit_harm_named,
+}
+
+
+def validate_case(completion_msg: str, user_msg: str, parse_fn: Callable[[str], list], rules: ValidationRules) -> dict[str, str]:
+    """
+    Runs the rules on a single generated case.
+        Returns:
+            rule -> reason for every rule the case fails, empty if the case is valid
+    """
+    try:
+        prompts = parse_fn(completion_msg)
+    except Exception as e:
+        return {"schema": f"completion could not be parsed: {e}"}
+
+    metadata = case_metadata(user_msg)
+    failures = {}
+    for rule in rules.rules:
+        reason = RULES[rule](prompts, metadata, rules)
+        if reason is not None:
+            failures[rule] = reason
+            if rule == "schema":
+                break
+    return failures
+
+
+def _init_worker(rules: ValidationRules, parse_fn: Callable[[str], list]):
+    """process pool initializer: the compiled rules are sent to every worker once"""
+    global _worker_state
+    _worker_state = (rules, parse_fn)
+
+
+def _validate_chunk(chunk: tuple[tuple[int, str, str], ...]) -> list[tuple[int, dict[str, str]]]:
+    rules, parse_fn = _worker_state
+    return [(index, validate_case(completion_msg, user_msg, parse_fn, rules)) for index, user_msg, completion_msg in chunk]
+
+
+def validate_responses(
+        responses: Dataset | dict,
+        parse_fn: Callable[[str], list],
+        rules: ValidationRules,
+        max_workers: int | None = None,
+        chunk_size: int = 256
+    ) -> tuple[list[int], dict]:
+    """
+    Validates every generated case of the responses across a process pool.
+        Args:
+            responses: verifiers results with prompt and completion columns
+            parse_fn: parses a completion message into a list of turns, raising on failure
+            rules: compiled validation rules
+            max_workers: number of worker processes, 1 validates in this process, as do responses
+                that fit in a single chunk
+            chunk_size: number of cases sent to a worker at once
+
+        Returns:
+            the indices of the valid cases, and a report with the number of rejections per rule
+            and the failed rules of every rejected case
+    """
+    cases = (
+        (index, next((m.get('content') for m in prompt if m.get('role') == 'user'), None), completion[0].get('content'))
+        for index, (prompt, completion) in enumerate(zip(responses['prompt'], responses['completion']))
+    )
+    chunks = batched(cases, chunk_size)
+
+    # a single chunk is not worth starting worker processes for
+    n_cases = len(responses['prompt']) if isinstance(responses, dict) else len(responses)
+    inline = max_workers == 1 or n_cases <= chunk_size
+    if inline:
+        _init_worker(rules, parse_fn)
+        results = map(_validate_chunk, chunks)
+    else:
+        spawn_pool = importlib.import_module("results-analyzer.parallel").spawn_pool
+        executor = spawn_pool(max_workers, initializer=_init_worker, initargs=(rules, parse_fn))
+        results = executor.map(_validate_chunk, chunks)
+
+    accepted, rejected = [], []
+    rejections = {rule: 0 for rule in rules.rules}
+    try:
+        for chunk in results:
+            for index, failures in chunk:
+                if not failures:
+                    accepted.append(index)
+                    continue
+                rejected.append({"index": index, "failures": failures})
+                for rule in failures:
+                    rejections[rule] += 1
+    finally:
+        if not inline:
+            executor.shutdown()
+
+    report = {
+        "n_cases": len(accepted) + len(rejected),
+        "n_accepted": len(accepted),
+        "rejections": rejections,
+        "rejected": rejected,
+    }
+    return accepted, report
+
+
+def write_report(report: dict, save_path: str | Path):
+    save_path = Path(save_path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(save_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"Successfully saved validation report to {save_path}")
+
+
+def print_report(report: dict):
+    print(f"Validated {report['n_cases']} cases: {report['n_accepted']} accepted, {report['n_cases'] - report['n_accepted']} rejected")
+    for rule, count in report["rejections"].items():
+        print(f"  {rule:20} {count:>6} rejected")
+
+
+def filter_responses(
+        responses: Dataset,
+        parse_fn: Callable[[str], list],
+        prompt_config: PromptConfig,
+        report_path: str | Path,
+        rules_file: str | Path = DEFAULT_RULES_FILE,
+        max_workers: int | None = None
+    ) -> Dataset:
+    """
+    Validation stage between generation and save_responses_to_json: validates the responses,
+    writes the rejection report to report_path and returns the valid responses only.
+    """
+    rules = compile_rules(prompt_config, rules_file)
+    accepted, report = validate_responses(responses, parse_fn, rules, max_workers)
+    write_report(report, report_path)
+    print_report(report)
+    return responses.select(accepted)
+
+
+def main(argv: list[str] | None = None):
+    from datasets import Dataset
+    from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+    parser = argparse.ArgumentParser(description="Validates the generated cases of a verifiers results file.")
+    parser.add_argument("results_file", type=Path, help="results.jsonl saved by verifiers")
+    parser.add_argument("--config", type=Path, required=True, help="prompt config used to generate the results")
+    parser.add_argument("--rules", type=Path, default=Path(DEFAULT_RULES_FILE))
+    parser.add_argument("--output", type=Path, default=None, help="where to save the report, next to the results by default")
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    rules = compile_rules(load_prompt_config(args.config), args.rules)
+    responses = Dataset.from_json(str(args.results_file))
+    _, report = validate_responses(responses, AdvancedPromptGenerator.parse_response, rules, args.max_workers)
+    write_report(report, args.output or args.results_file.parent / "validation_report.json")
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,4 @@
 from pathlib import Path
-from datasets import Dataset
 from data.base_prompt_generator import BasePromptGenerator
 from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
 
@@ -8,6 +7,8 @@ def main(
         input_file: Path,
         random_categories : dict[str]
     ):
+    from datasets import Dataset
+
     gen = AdvancedPromptGenerator(input_file, random_categories)
     responses = Dataset.from_json(str(results_path))
     gen.save_responses_to_json(results_path.parent / 'batches', responses, batch_size=5)
@@ -1,13 +1,15 @@
 """
 https://verifiers.readthedocs.io/en/latest/
+
+verifiers, datasets and openai take seconds to import, so they are imported by the
+functions that use them rather than at module level. This module and the prompt generators
+import datasets under TYPE_CHECKING only, for type hints.
 """
 
+from __future__ import annotations
 import os
 import json
-from datasets import Dataset
-import verifiers as vf
-from verifiers.utils.eval_utils import save_results, make_dataset
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING
 from data.base_prompt_generator import BasePromptGenerator
 
 from data.prompt_generator.prompt_generator import PromptGenerator
@@ -16,6 +18,9 @@ from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPro
 
 import asyncio
 
+if TYPE_CHECKING:
+    from datasets import Dataset
+
 def reward_response(prompt, completion, answer, state) -> int:
     response = completion[-1]['content']
     try:
@@ -26,31 +31,69 @@ def reward_response(prompt, completion, answer, state) -> int:
 
     return 1.0
 
-def load_dataset(gen: BasePromptGenerator, num_examples: int, random_seed: int = -1) -> Dataset:
+def reward_packed_response(prompt, completion, answer, state) -> float:
+    """fraction of the packed prompts that received a valid list of 12 user queries"""
+    num_cells = len(json.loads(answer))
+    try:
+        cases = PromptGenerator.parse_response(completion[-1]['content'])
+    except Exception as e:
+        return 0.0
+    if not isinstance(cases, list):
+        return 0.0
+
+    return sum(isinstance(case, list) and len(case) == 12 for case in cases[:num_cells]) / num_cells
+
+def load_dataset(gen: BasePromptGenerator, num_examples: int, random_seed: int = -1, allocation_file: str | None = None, prefix_cache: bool = False, pack_size: int = 1) -> Dataset:
     """
     loads the dataset used to prompt the synthetic data generator
     Args:
         - gen: an instance of prompt generator class
         - num_examples: the number of prompts to be generated
+        - allocation_file: optional allocation saved by data.adaptive_allocation; every prompt is
+          repeated as many times as its grid cell is allocated, and unallocated cells are dropped;
+          the allocation must be built from the same prompt config as gen
+        - prefix_cache: order the prompts so that consecutive requests share the longest prefixes,
+          overriding random_seed shuffling, see data.prefix_cache
+        - pack_size: number of prompts packed into every request
 
     Returns:
-        - dataset of size num_examples
+        - dataset of size num_examples, or of the allocated size, divided by pack_size
     """
+    from datasets import Dataset
+
     dict = gen.load_prompts(num_examples, random_seed)
+    if allocation_file is not None:
+        from data.adaptive_allocation import allocate_dataset, load_allocation
+        allocation, factors = load_allocation(allocation_file)
+        # categories drawn at random per prompt are expanded to every allocated level
+        dict = allocate_dataset(dict, allocation, factors, expand=getattr(gen, "random_attributes", None))
+    if prefix_cache or pack_size > 1:
+        from data.prefix_cache import order_for_prefix_reuse, pack_cells
+        # select the examples before reordering or packing them
+        if num_examples != -1:
+            dict = {key: values[:num_examples] for key, values in dict.items()}
+        if prefix_cache:
+            dict = order_for_prefix_reuse(dict)
+        if pack_size > 1:
+            dict = pack_cells(dict, pack_size)
     return Dataset.from_dict(dict)
 
-async def main(base_url: str, api_key: str, model: str, gen: BasePromptGenerator, num_examples: int = -1, random_seed: int = 11111111, rollouts_per_example: int = 1, save_batch_size : int = -1):
+async def main(base_url: str, api_key: str, model: str, gen: BasePromptGenerator, num_examples: int = -1, random_seed: int = 11111111, rollouts_per_example: int = 1, save_batch_size : int = -1, allocation_file: str | None = None, rollout_selection: str = "all", validation_rules_file: str | None = None, prefix_cache: bool = False, pack_size: int = 1, save_format: str = "json", save_compression: str | None = None):
+    import verifiers as vf
+    from verifiers.utils.eval_utils import save_results, make_dataset
+    from openai import AsyncOpenAI
+
     # load prompts
     assert hasattr(gen, "system_prompt"), "error: gen does not have system_prompt attribute"
     #assert rollouts_per_example == 1, "rollouts_per_example must be 1 until prompt generators are implemented to handle multiple."
 
     system_prompt : str = gen.system_prompt
-    dataset = load_dataset(gen, num_examples, random_seed)
+    dataset = load_dataset(gen, num_examples, random_seed, allocation_file, prefix_cache, pack_size)
     
     # generate data
     env = vf.SingleTurnEnv(
         dataset=dataset,
-        rubric=vf.Rubric(funcs=[reward_response]),
+        rubric=vf.Rubric(funcs=[reward_packed_response if pack_size > 1 else reward_response]),
         system_prompt=system_prompt,
     )
     
@@ -58,11 +101,16 @@ async def main(base_url: str, api_key: str, model: str, gen: BasePromptGenerator
         api_key=api_key,
         base_url=base_url,
     )
+
+    if prefix_cache:
+        from data.prefix_cache import warm_cache
+        await warm_cache(client, model, system_prompt, dataset[0]["question"])
     
     results = await env.evaluate(
         client = client,
         model = model,
-        num_examples=num_examples,
+        # load_dataset already selects num_examples prompts before packing them
+        num_examples=num_examples if pack_size == 1 else -1,
         rollouts_per_example=rollouts_per_example,
         sampling_args={"temperature": 0.7},
         max_concurrent=15
@@ -75,10 +123,30 @@ async def main(base_url: str, api_key: str, model: str, gen: BasePromptGenerator
         hf_hub_dataset_name="abusch472/ai-psychosis-eval-data"
     )
 
+    responses = make_dataset(results)
+    if prefix_cache or pack_size > 1:
+        from data.prefix_cache import cache_report, print_cache_report, unpack_responses
+        print_cache_report(cache_report(results))
+        if pack_size > 1:
+            responses = unpack_responses(responses, type(gen).parse_response, pack_size)
+
+    if validation_rules_file is not None:
+        from data.case_validation import filter_responses
+        responses = filter_responses(
+            responses,
+            parse_fn=type(gen).parse_response,
+            prompt_config=gen.config,
+            report_path=f"{results.metadata.path_to_save}/validation_report.json",
+            rules_file=validation_rules_file
+        )
+
     gen.save_responses_to_json(
         filepath=f"{results.metadata.path_to_save}/batches",
-        responses = make_dataset(results),
-        batch_size=save_batch_size
+        responses = responses,
+        batch_size=save_batch_size,
+        rollouts=rollout_selection,
+        output_format=save_format,
+        compression=save_compression
     )
 
 if __name__ == "__main__":
@@ -97,9 +165,16 @@ if __name__ == "__main__":
     random_seed = -1 # no shuffling
     rollouts_per_example = 1
     save_batch_size = 5
+    save_format = "json" # or the compact "jsonl" / "parquet", read back with data.case_io.read_cases
+    save_compression = None # or "zstd", for jsonl and parquet
+    allocation_file = None # e.g. allocation.json from data.adaptive_allocation, with rollouts_per_example = 1
+    rollout_selection = "all" # "best" saves only the best of the rollouts_per_example rollouts of each example
+    validation_rules_file = "data/validation_rules.yaml" # None saves cases without structural validation
+    prefix_cache = False # order requests to reuse the cached system prompt prefix, and report cached tokens
+    pack_size = 1 # number of grid cells generated per request
 
     api_key = os.environ.get(api_key_loc)
     if api_key is None:
         raise ValueError(f"{api_key_loc} must be provided")
 
-    asyncio.run(main(base_url, api_key, model, gen, num_examples, random_seed, rollouts_per_example, save_batch_size))
\ No newline at end of file
+    asyncio.run(main(base_url, api_key, model, gen, num_examples, random_seed, rollouts_per_example, save_batch_size, allocation_file, rollout_selection, validation_rules_file, prefix_cache, pack_size, save_format, save_compression))
\ No newline at end of file
@@ -1,12 +1,16 @@
+from __future__ import annotations
 import re
-import os
 import json
-import yaml
 import itertools
 from pathlib import Path
 from data.base_prompt_generator import BasePromptGenerator
-from datasets import Dataset
+from data.prompt_config import load_prompt_config
+from data.rollout_selection import select_rollouts, has_multiple_rollouts, default_quality
 import random
+from typing import Callable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from datasets import Dataset
 
 class ImprovedPromptGenerator(BasePromptGenerator):
     """
@@ -33,16 +37,12 @@ class ImprovedPromptGenerator(BasePromptGenerator):
 
     def __init__(self, input_file = "data/improved_prompt_generator/improved_prompt_config.yaml"):
         """uses a random init value to initialize prompt characteristics"""
-        if not os.path.isfile(input_file):
-            raise ValueError(f"File: {input_file} could not be located.")
-        
-        with open(input_file) as f:
-            self._loaded_yaml = yaml.safe_load(f)
+        self.config = load_prompt_config(input_file)
 
-        self.system_prompt = self._loaded_yaml.get("system_prompt", "")
-        themes = self._loaded_yaml.get("themes", [])
-        harms = self._loaded_yaml.get("harms", [])
-        styles = self._loaded_yaml.get("text_style", [])
+        self.system_prompt = self.config.system_prompt or ""
+        themes = self.config.values("themes")
+        harms = self.config.values("harms")
+        styles = self.config.values("text_style")
         # styles = [{"name": "Standard", "description": "No style modifications"}] # TODO: remove
         conditions = ["Implicit"]
         self.prompt_tuples = list(itertools.product(themes, harms, styles, conditions))
@@ -115,7 +115,7 @@ class ImprovedPromptGenerator(BasePromptGenerator):
         return match.groupdict()
     
 
-    def save_responses_to_json(self, filename: Path, responses: Dataset):
+    def save_responses_to_json(self, filename: Path, responses: Dataset, rollouts: str = "all", score_fn: Callable[[list], float] | None = None):
         """
         saves the LLM responses to specified filename in the json format expected by psychosis-bench
 
@@ -133,7 +133,10 @@ class ImprovedPromptGenerator(BasePromptGenerator):
             ]
         }
 
-        TODO: this function has not been designed to handle num_rollouts != 1
+        rollouts: "all" saves every rollout, tagged with its example_id and rollout_id when
+            some example has several rollouts, "best" saves only the best rollout of every
+            example, see data.rollout_selection
+        score_fn: quality score of a parsed rollout, defaults to rollout_selection.default_quality
 
         """
 
@@ -141,38 +144,27 @@ class ImprovedPromptGenerator(BasePromptGenerator):
             "cases" : []
         }
 
-        prompt_list = responses['prompt']
-        completion_list = responses['completion']
+        selected = select_rollouts(responses, ImprovedPromptGenerator.parse_response, rollouts, score_fn or default_quality)
+        tag_rollouts = rollouts == "all" and has_multiple_rollouts(selected)
 
-        id = 0
-        for prompt_messages, completion in zip(prompt_list, completion_list):
-            user_msg = next((m.get('content') for m in prompt_messages if m.get('role') == 'user'), None)
-            completion_msg = completion[0].get('content')
-
-            metadata = self._match_pattern(user_msg)
+        for id, rollout in enumerate(selected):
+            metadata = self._match_pattern(rollout.user_msg)
             theme = metadata.get('theme', '')
             harm = metadata.get('harm', '')
             condition = metadata.get('condition', '')
             style = metadata.get('style', '')
-            
-            try:
-                prompts = ImprovedPromptGenerator.parse_response(completion_msg)
-            except Exception as e:
-                print(f"Error parsing completion msg: {completion_msg}", e)
-                continue
-            
-            dict_to_save['cases'].append(
-                {
-                    'id': str(id),
-                    'name': f"{theme}_{harm}_{condition}_{style}",
-                    'theme': theme,
-                    'condition': f"{condition}_{style}",
-                    'harm_type': harm,
-                    'prompts': prompts
-                }
-            )
-
-            id += 1
+
+            case = {
+                'id': str(id if rollouts == "all" else rollout.example_id),
+                'name': f"{theme}_{harm}_{condition}_{style}",
+                'theme': theme,
+                'condition': f"{condition}_{style}",
+                'harm_type': harm,
+                'prompts': rollout.prompts
+            }
+            if tag_rollouts:
+                case |= {'example_id': rollout.example_id, 'rollout_id': rollout.rollout_id}
+            dict_to_save['cases'].append(case)
 
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(dict_to_save, f, indent=4)
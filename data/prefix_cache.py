@@ -0,0 +1,151 @@
+"""
+Prefix-cache friendly request layout for synthetic data generation.
+
+Providers cache the longest previously seen prefix of a request. The multi-kilobyte system
+prompt is byte-identical across requests, so it is cached after the first request, as long as
+requests are not all dispatched before that first one completes. This module:
+
+- orders the prompts so that consecutive requests share the longest possible prefixes
+- warms the cache with a single request before the concurrent dispatch
+- optionally packs several grid cells into one request, with the packing instruction in the
+  user message so that the system prompt stays unchanged, and unpacks the responses into one
+  row per cell
+- reports the fraction of prompt tokens served from the cache
+"""
+
+from __future__ import annotations
+import json
+from itertools import batched
+from typing import Callable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from datasets import Dataset
+    from openai import AsyncOpenAI
+    from verifiers.types import GenerateOutputs
+
+PACK_INSTRUCTION = (
+    "You will receive a JSON list of {pack_size} prompts instead of a single prompt. "
+    "Follow the instructions above for every prompt, and respond with a single valid JSON list "
+    "containing {pack_size} lists of 12 strings, one list per prompt, in the same order as the prompts."
+)
+
+
+def order_for_prefix_reuse(dataset_dict: dict) -> dict:
+    """
+    Sorts the rows of a dataset dict by question, so that consecutive requests share the longest
+    possible prefix, e.g. all json prompts of a theme are dispatched together.
+    """
+    order = sorted(range(len(dataset_dict["question"])), key=lambda i: dataset_dict["question"][i])
+    return {key: [values[i] for i in order] for key, values in dataset_dict.items()}
+
+
+def _as_json(question: str):
+    try:
+        return json.loads(question)
+    except json.JSONDecodeError:
+        return question
+
+
+def pack_cells(dataset_dict: dict, pack_size: int) -> dict:
+    """
+    Packs every pack_size consecutive questions into a single request.
+    The original questions are kept in the answer column, to unpack the responses with.
+        Returns:
+            dataset dict with question and answer columns, of ceil(n / pack_size) rows
+    """
+    assert pack_size >= 1, "Error: pack_size must be at least 1."
+    packed = {"question": [], "answer": []}
+    for questions in batched(dataset_dict["question"], pack_size):
+        instruction = PACK_INSTRUCTION.format(pack_size=len(questions))
+        packed["question"].append(f"{instruction}\n\n{json.dumps([_as_json(q) for q in questions], indent=4)}")
+        packed["answer"].append(json.dumps(questions))
+    return packed
+
+
+def unpack_responses(responses: Dataset, parse_fn: Callable[[str], list], pack_size: int) -> Dataset:
+    """
+    Splits packed responses into one row per grid cell, in the layout save_responses_to_json expects.
+    The cell j of packed example i gets example_id i * pack_size + j, so that the rollouts of a
+    cell keep a common example_id. Other columns, e.g. reward, are copied to every cell.
+        Args:
+            responses: verifiers results of packed requests, with the original questions as answer
+            parse_fn: parses a completion message into a json list, raising on failure
+            pack_size: the pack size the requests were packed with
+
+        Returns:
+            dataset with one row per cell of every packed response that parses
+    """
+    from datasets import Dataset
+
+    columns = [c for c in responses.column_names if c not in ("example_id", "prompt", "completion", "answer")]
+    unpacked = {"example_id": [], "prompt": [], "completion": []} | {c: [] for c in columns}
+
+    for row in responses:
+        questions = json.loads(row["answer"])
+        completion_msg = row["completion"][0].get("content")
+        try:
+            cases = parse_fn(completion_msg)
+            assert isinstance(cases, list) and all(isinstance(case, list) for case in cases), "expected a list of lists"
+        except Exception as e:
+            print(f"Error parsing packed completion msg: {completion_msg}", e)
+            continue
+        if len(cases) != len(questions):
+            print(f"Warning: packed completion has {len(cases)} cases for {len(questions)} prompts, unmatched cells are dropped.")
+
+        system_msgs = [m for m in row["prompt"] if m.get("role") == "system"]
+        for j, (question, case) in enumerate(zip(questions, cases)):
+            unpacked["example_id"].append(row["example_id"] * pack_size + j)
+            unpacked["prompt"].append(system_msgs + [{"role": "user", "content": question}])
+            unpacked["completion"].append([{"role": "assistant", "content": json.dumps(case)}])
+            for c in columns:
+                unpacked[c].append(row[c])
+
+    return Dataset.from_dict(unpacked)
+
+
+async def warm_cache(client: AsyncOpenAI, model: str, system_prompt: str, question: str, max_completion_tokens: int = 16) -> bool:
+    """
+    Sends a single, short request with the shared system prompt, so that the prefix is cached
+    before the concurrent requests are dispatched. The warm-up is only an optimization: a failed
+    request, e.g. a model that rejects the token limit, is reported and the run goes on uncached.
+        Returns:
+            whether the warm-up request succeeded
+    """
+    try:
+        await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": question}],
+            # max_tokens is rejected by reasoning models, and too small a limit may be as well
+            max_completion_tokens=max_completion_tokens,
+        )
+    except Exception as e:
+        print(f"Warning: prompt cache warm-up failed, continuing without it: {e}")
+        return False
+    return True
+
+
+def cache_report(results: GenerateOutputs) -> dict:
+    """
+    Sums the prompt and cached prompt tokens reported in the usage of every response.
+    Providers that do not report cached tokens count as uncached.
+    """
+    report = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+    for state in results.state:
+        for response in state.get("responses", []):
+            usage = getattr(response, "usage", None)
+            if usage is None:
+                continue
+            details = getattr(usage, "prompt_tokens_details", None)
+            report["requests"] += 1
+            report["prompt_tokens"] += usage.prompt_tokens or 0
+            report["cached_tokens"] += (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+    report["cached_ratio"] = report["cached_tokens"] / report["prompt_tokens"] if report["prompt_tokens"] else 0.0
+    return report
+
+
+def print_cache_report(report: dict):
+    print(
+        f"Prompt cache: {report['cached_tokens']} of {report['prompt_tokens']} prompt tokens cached "
+        f"({report['cached_ratio']:.1%}) over {report['requests']} requests"
+    )
@@ -0,0 +1,226 @@
+"""
+Shared loader for the prompt generator yaml configs.
+
+A config is parsed and validated once, compiled into an immutable PromptConfig, and memoized
+by path and modification time both in process and in an on-disk pickle cache, so that
+constructing a generator does not re-parse its yaml.
+"""
+
+import os
+import sys
+import yaml
+import pickle
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+
+# bump when PromptConfig changes, so that stale pickles are never loaded
+CACHE_VERSION = 1
+CACHE_DIR_ENV = "PROMPT_CONFIG_CACHE_DIR"
+
+_memo: dict[tuple, "PromptConfig"] = {}
+
+
+class PromptConfigError(ValueError):
+    """raised when a prompt config does not match the expected schema"""
+
+
+@dataclass(frozen=True)
+class Level:
+    """
+    A single level of a category, e.g. one theme or one harm type.
+    Levels written as plain strings in the yaml have structured = False.
+    """
+    name: str
+    description: str | None = None
+    structured: bool = True
+
+    def __post_init__(self):
+        # level names are compared and hashed constantly when building and grouping prompts
+        object.__setattr__(self, "name", sys.intern(self.name))
+
+    def __reduce__(self):
+        # rebuild through __init__ when unpickling, so that names are interned again
+        return (Level, (self.name, self.description, self.structured))
+
+    @property
+    def value(self) -> str | dict:
+        """the level as written in the yaml: a string, or a dict with name and description"""
+        if not self.structured:
+            return self.name
+        return {"name": self.name} | ({"description": self.description} if self.description is not None else {})
+
+
+@dataclass(frozen=True)
+class PromptConfig:
+    """
+    An immutable, validated prompt config.
+        system_prompt: the system prompt, or None if the config has none
+        categories: (category, levels) pairs in yaml order, e.g. ("theme", (Level(...), ...))
+    """
+    system_prompt: str | None
+    categories: tuple[tuple[str, tuple[Level, ...]], ...]
+
+    def __contains__(self, category: str) -> bool:
+        return any(key == category for key, _ in self.categories)
+
+    def get(self, category: str, default: tuple = ()) -> tuple[Level, ...]:
+        return next((levels for key, levels in self.categories if key == category), default)
+
+    def values(self, category: str) -> list[str | dict]:
+        """the levels of category as written in the yaml"""
+        return [level.value for level in self.get(category)]
+
+
+def _compile_level(category: str, index: int, entry) -> Level:
+    where = f"{category}[{index}]"
+    if isinstance(entry, str):
+        return Level(entry, structured=False)
+    if not isinstance(entry, dict):
+        raise PromptConfigError(f"Error: {where} must be a string or a mapping, got {type(entry).__name__}.")
+
+    unknown = set(entry) - {"name", "description"}
+    if unknown:
+        raise PromptConfigError(f"Error: {where} has unknown keys {sorted(unknown)}.")
+    if not isinstance(entry.get("name"), str) or not entry["name"]:
+        raise PromptConfigError(f"Error: {where} must have a non-empty string name.")
+    if "description" in entry and not isinstance(entry["description"], str):
+        raise PromptConfigError(f"Error: {where} description must be a string.")
+
+    return Level(entry["name"], entry.get("description"))
+
+
+def compile_config(loaded_yaml) -> PromptConfig:
+    """
+    Validates a parsed yaml config and compiles it into a PromptConfig.
+    Every key other than system_prompt is a category holding a list of levels.
+    """
+    if not isinstance(loaded_yaml, dict):
+        raise PromptConfigError("Error: a prompt config must be a mapping.")
+
+    system_prompt = loaded_yaml.get("system_prompt")
+    if system_prompt is not None and not isinstance(system_prompt, str):
+        raise PromptConfigError("Error: system_prompt must be a string.")
+
+    categories = []
+    for key, entries in loaded_yaml.items():
+        if key == "system_prompt":
+            continue
+        if not isinstance(key, str):
+            raise PromptConfigError(f"Error: category {key!r} must be a string.")
+        if not isinstance(entries, list):
+            raise PromptConfigError(f"Error: category {key} must be a list of levels.")
+
+        levels = tuple(_compile_level(key, i, entry) for i, entry in enumerate(entries))
+        names = [level.name for level in levels]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise PromptConfigError(f"Error: category {key} has duplicate levels {duplicates}.")
+        categories.append((sys.intern(key), levels))
+
+    return PromptConfig(system_prompt, tuple(categories))
+
+
+def _cache_dir() -> Path | None:
+    """the cache directory, or None when the disk cache is disabled by setting the env variable to an empty string"""
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir == "":
+        return None
+    return Path(cache_dir) if cache_dir else Path.home() / ".cache" / "ai-psychosis-eval" / "prompt_configs"
+
+
+def _cache_file(path: str, stat: os.stat_result) -> Path | None:
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return None
+    path_hash = hashlib.sha256(path.encode()).hexdigest()[:16]
+    return cache_dir / f"{path_hash}-{stat.st_mtime_ns}-{stat.st_size}-v{CACHE_VERSION}.pkl"
+
+
+def _is_private(path: Path) -> bool:
+    """
+    Unpickling runs arbitrary code, so cache files are only loaded from a directory and files owned
+    by the current user that nobody else can write to.
+    """
+    if not hasattr(os, "getuid"):
+        return True
+    for entry in (path.parent, path):
+        stat = os.stat(entry)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+            return False
+    return True
+
+
+def _read_cache(cache_file: Path) -> PromptConfig | None:
+    try:
+        if not _is_private(cache_file):
+            print(f"Warning: ignoring prompt config cache {cache_file}, it is writable by other users.")
+            return None
+        with open(cache_file, 'rb') as f:
+            config = pickle.load(f)
+    except Exception:
+        # missing, truncated or incompatible cache files are re-parsed
+        return None
+    return config if isinstance(config, PromptConfig) else None
+
+
+def _write_cache(cache_file: Path, config: PromptConfig):
+    try:
+        os.makedirs(cache_file.parent, mode=0o700, exist_ok=True)
+        # remove pickles of earlier versions of the same file
+        for stale in cache_file.parent.glob(f"{cache_file.name.split('-')[0]}-*.pkl"):
+            stale.unlink(missing_ok=True)
+
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # the cache is an optimization only, e.g. the cache directory may be read-only
+        pass
+
+
+def load_prompt_config(input_file: str | Path, required: tuple[str, ...] = (), use_disk_cache: bool = True) -> PromptConfig:
+    """
+    Loads, validates and compiles a prompt config, memoized by path and modification time.
+        Args:
+            input_file: path to the yaml config
+            required: categories that must be present and non-empty
+            use_disk_cache: also memoize in the on-disk pickle cache, shared between processes. The cache
+                lives in $PROMPT_CONFIG_CACHE_DIR, or ~/.cache/ai-psychosis-eval/prompt_configs, and is
+                disabled when PROMPT_CONFIG_CACHE_DIR is set to an empty string. The directory must be
+                private: cache files are pickles, and are only loaded when owned by the current user and
+                not writable by anyone else.
+
+        Returns:
+            the compiled PromptConfig
+    """
+    if not os.path.isfile(input_file):
+        raise ValueError(f"File: {input_file} could not be located.")
+
+    path = os.path.realpath(input_file)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    config = _memo.get(key)
+    if config is None:
+        cache_file = _cache_file(path, stat)
+        use_disk_cache = use_disk_cache and cache_file is not None
+        config = _read_cache(cache_file) if use_disk_cache else None
+        if config is None:
+            with open(path) as f:
+                config = compile_config(yaml.safe_load(f))
+            if use_disk_cache:
+                _write_cache(cache_file, config)
+        _memo[key] = config
+
+    for category in required:
+        if not config.get(category):
+            raise PromptConfigError(f"Error: missing required attribute {category} in {input_file}")
+
+    return config
+
+
+def clear_config_cache():
+    """clears the in-process memo; the on-disk cache is keyed by modification time and needs no clearing"""
+    _memo.clear()
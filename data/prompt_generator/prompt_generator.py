@@ -1,10 +1,15 @@
+from __future__ import annotations
 import re
 import json
-import yaml
 import itertools
 from pathlib import Path
 from data.base_prompt_generator import BasePromptGenerator
-from datasets import Dataset
+from data.prompt_config import load_prompt_config
+from data.rollout_selection import select_rollouts, has_multiple_rollouts, default_quality
+from typing import Callable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from datasets import Dataset
 
 class PromptGenerator(BasePromptGenerator):
     """a synthetic data prompt data loader for a string of user prompts"""
@@ -22,12 +27,11 @@ class PromptGenerator(BasePromptGenerator):
 
     def __init__(self):
         """uses a random init value to initialize prompt characteristics"""
-        with open("data/prompt_generator/prompt_config.yaml") as f:
-            self._loaded_yaml = yaml.safe_load(f)
+        self.config = load_prompt_config("data/prompt_generator/prompt_config.yaml")
 
-        self.system_prompt = self._loaded_yaml.get("system_prompt", "")
-        themes = self._loaded_yaml.get("themes", [])
-        harms = self._loaded_yaml.get("harms", [])
+        self.system_prompt = self.config.system_prompt or ""
+        themes = self.config.values("themes")
+        harms = self.config.values("harms")
         conditions = ["Explicit", "Implicit"] 
         self.prompt_tuples = list(itertools.product(themes, harms, conditions))
 
@@ -64,7 +68,7 @@ class PromptGenerator(BasePromptGenerator):
 
         return dataset_dict
 
-    def save_responses_to_json(self, filename: Path, responses: Dataset):
+    def save_responses_to_json(self, filename: Path, responses: Dataset, rollouts: str = "all", score_fn: Callable[[list], float] | None = None):
         """
         saves the LLM responses to specified filename in the json format expected by psychosis-bench
 
@@ -82,7 +86,10 @@ class PromptGenerator(BasePromptGenerator):
             ]
         }
 
-        TODO: this function has not been designed to handle num_rollouts != 1
+        rollouts: "all" saves every rollout, tagged with its example_id and rollout_id when
+            some example has several rollouts, "best" saves only the best rollout of every
+            example, see data.rollout_selection
+        score_fn: quality score of a parsed rollout, defaults to rollout_selection.default_quality
 
         """
 
@@ -97,41 +104,30 @@ class PromptGenerator(BasePromptGenerator):
             Condition:\s*(?P<condition>.*)$
         """
 
-        prompt_list = responses['prompt']
-        completion_list = responses['completion']
-        print(len(prompt_list))
-
-        id = 0
-        for prompt_messages, completion in zip(prompt_list, completion_list):
-            user_msg = next((m.get('content') for m in prompt_messages if m.get('role') == 'user'), None)
-            completion_msg = completion[0].get('content')
+        selected = select_rollouts(responses, PromptGenerator.parse_response, rollouts, score_fn or default_quality)
+        tag_rollouts = rollouts == "all" and has_multiple_rollouts(selected)
 
-            match = re.search(pattern, user_msg, re.VERBOSE | re.MULTILINE)
+        for id, rollout in enumerate(selected):
+            match = re.search(pattern, rollout.user_msg, re.VERBOSE | re.MULTILINE)
             if not match:
-                raise ValueError(f'Error: user_msg [{user_msg}] could not be formatted as expected')
+                raise ValueError(f'Error: user_msg [{rollout.user_msg}] could not be formatted as expected')
             
             metadata = match.groupdict()
             theme = metadata.get('theme', '')
             harm = metadata.get('harm', '')
             condition = metadata.get('condition', '')
-            try:
-                prompts = PromptGenerator.parse_response(completion_msg)
-            except Exception as e:
-                print(f"Error parsing completion msg: {completion_msg}", e)
-                continue
-            
-            dict_to_save['cases'].append(
-                {
-                    'id': str(id),
-                    'name': f"{theme}_{harm}_{condition}",
-                    'theme': theme,
-                    'condition': condition,
-                    'harm_type': harm,
-                    'prompts': prompts
-                }
-            )
-
-            id += 1
+
+            case = {
+                'id': str(id if rollouts == "all" else rollout.example_id),
+                'name': f"{theme}_{harm}_{condition}",
+                'theme': theme,
+                'condition': condition,
+                'harm_type': harm,
+                'prompts': rollout.prompts
+            }
+            if tag_rollouts:
+                case |= {'example_id': rollout.example_id, 'rollout_id': rollout.rollout_id}
+            dict_to_save['cases'].append(case)
 
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(dict_to_save, f, indent=4)
@@ -0,0 +1,145 @@
+"""
+Rollout-aware selection of generated cases at save time.
+
+With rollouts_per_example > 1 every example is generated N times. select_rollouts groups the
+rollouts by example_id in a single pass over the responses, read a batch of rows at a time,
+scores every rollout with a cheap, pluggable quality function, and keeps either the best rollout
+of each example or all of them.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from datasets import Dataset
+
+ROLLOUT_MODES = ("all", "best")
+
+# number of user turns and turns per phase expected by psychosis-bench
+NUM_TURNS = 12
+TURNS_PER_PHASE = 3
+
+
+@dataclass
+class Rollout:
+    """
+    A single parsed rollout.
+        index: row of the rollout in the responses
+        example_id: the example the rollout was generated for
+        rollout_id: position of the rollout among the rollouts of its example, in row order
+        user_msg: the user message the rollout answers
+        prompts: the parsed list of user turns
+        score: quality score given by the score function
+    """
+    index: int
+    example_id: int | str
+    rollout_id: int
+    user_msg: str
+    prompts: list
+    score: float
+
+
+def default_quality(prompts: list, min_chars: int = 10, max_chars: int = 4000) -> float:
+    """
+    Cheap structural quality score in [0, 1] of a parsed rollout.
+
+    A rollout that is not a list of exactly 12 strings scores 0. Otherwise the score averages
+    the fraction of turns within [min_chars, max_chars], the fraction of distinct turns, and the
+    fraction of phases (3 turns each) that are at least as long as half the mean phase length.
+    """
+    if not isinstance(prompts, list) or len(prompts) != NUM_TURNS or not all(isinstance(p, str) for p in prompts):
+        return 0.0
+
+    lengths = [len(p.strip()) for p in prompts]
+    within_bounds = sum(min_chars <= n <= max_chars for n in lengths) / NUM_TURNS
+    distinct = len(set(p.strip().lower() for p in prompts)) / NUM_TURNS
+
+    # a phase that collapses to a few words usually means the model skipped part of the progression
+    phase_lengths = [sum(lengths[i:i + TURNS_PER_PHASE]) for i in range(0, NUM_TURNS, TURNS_PER_PHASE)]
+    mean_phase = sum(phase_lengths) / len(phase_lengths)
+    balanced = sum(n >= mean_phase / 2 for n in phase_lengths) / len(phase_lengths)
+
+    return (within_bounds + distinct + balanced) / 3
+
+
+def _iter_rows(responses: Dataset | dict, columns: list[str], batch_size: int = 1000) -> Iterator[tuple]:
+    """yields the values of columns row by row, reading a Dataset batch_size rows at a time"""
+    if isinstance(responses, dict):
+        yield from zip(*(responses[c] for c in columns))
+        return
+    for batch in responses.select_columns(columns).iter(batch_size=batch_size):
+        yield from zip(*(batch[c] for c in columns))
+
+
+def iter_rollouts(responses: Dataset | dict, parse_fn: Callable[[str], list]) -> Iterator[Rollout]:
+    """
+    Yields every rollout whose completion parses, numbering rollouts within each example.
+    Examples are identified by example_id, or by their user message when there is no such column.
+    """
+    column_names = list(getattr(responses, "column_names", None) or responses.keys())
+    if 'example_id' in column_names:
+        rows = _iter_rows(responses, ['prompt', 'completion', 'example_id'])
+    else:
+        rows = ((prompt, completion, None) for prompt, completion in _iter_rows(responses, ['prompt', 'completion']))
+
+    rollout_counts = {}
+    for index, (prompt_messages, completion, example_id) in enumerate(rows):
+        user_msg = next((m.get('content') for m in prompt_messages if m.get('role') == 'user'), None)
+        if example_id is None:
+            example_id = user_msg
+        rollout_id = rollout_counts.get(example_id, 0)
+        rollout_counts[example_id] = rollout_id + 1
+
+        completion_msg = completion[0].get('content')
+        try:
+            prompts = parse_fn(completion_msg)
+        except Exception as e:
+            print(f"Error parsing completion msg: {completion_msg}", e)
+            continue
+
+        yield Rollout(index, example_id, rollout_id, user_msg, prompts, 0.0)
+
+
+def select_rollouts(
+        responses: Dataset | dict,
+        parse_fn: Callable[[str], list],
+        mode: str = "all",
+        score_fn: Callable[[list], float] = default_quality
+    ) -> list[Rollout]:
+    """
+    Groups rollouts by example in a single pass over the responses and selects which to keep.
+        Args:
+            responses: verifiers results with prompt, completion and (optionally) example_id columns
+            parse_fn: parses a completion message into a list of user turns, raising on failure
+            mode: "all" keeps every rollout that parses, "best" keeps the highest scoring rollout
+                of every example (the first one on ties)
+            score_fn: quality score of a parsed rollout, higher is better
+
+        Returns:
+            the selected rollouts, in order of first appearance of their example
+    """
+    assert mode in ROLLOUT_MODES, f"Error: unknown rollout mode {mode}, expected one of {ROLLOUT_MODES}."
+
+    selected = {}
+    for rollout in iter_rollouts(responses, parse_fn):
+        rollout.score = score_fn(rollout.prompts)
+        if mode == "all":
+            selected[(rollout.example_id, rollout.rollout_id)] = rollout
+            continue
+
+        # only the best rollout per example is held in memory
+        best = selected.get(rollout.example_id)
+        if best is None or rollout.score > best.score:
+            selected[rollout.example_id] = rollout
+
+    return list(selected.values())
+
+
+def has_multiple_rollouts(selected: list[Rollout]) -> bool:
+    """
+    Whether any example of the selected rollouts was generated more than once. Cases only carry
+    example_id and rollout_id in that case, so that single rollout runs keep the same case keys
+    as older batches, which the results analyzer requires to be identical across result files.
+    """
+    return any(rollout.rollout_id > 0 for rollout in selected)
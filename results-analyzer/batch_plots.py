@@ -0,0 +1,139 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass, asdict
+from pathlib import Path
+import pandas as pd
+from pandas import DataFrame as df
+
+from .parallel import spawn_pool
+from .results_analyzer import METRICS, melt_scores, save_aggregate_box_plot, save_per_model_box_plot
+
+MANIFEST_NAME = "plot_manifest.json"
+
+
+@dataclass(frozen=True)
+class PlotSpec:
+    """
+    A single figure to render.
+        kind: "aggregate" (save_aggregate_box_plot) or "per_model" (save_per_model_box_plot)
+        groupby: the column used as x (aggregate) or hue (per_model)
+        filename: file name of the figure, relative to the output directory
+        metric: the metric plotted, per_model only
+    """
+    kind: str
+    groupby: str
+    filename: str
+    metric: str | None = None
+
+
+def report_plot_specs(groupbys: list[str] = ["jailbreak", "model"], metrics: list[str] = METRICS) -> list[PlotSpec]:
+    """
+    the standard report figures: an aggregate plot per groupby, and a per model plot
+    per (groupby, metric) for every groupby other than model
+    """
+    specs = [PlotSpec("aggregate", groupby, f"aggregate_scores_{groupby}.png") for groupby in groupbys]
+    specs += [
+        PlotSpec("per_model", groupby, f"model_results_{groupby}_{metric.removeprefix('avg_')}.png", metric)
+        for groupby in groupbys if groupby != "model"
+        for metric in metrics
+    ]
+    return specs
+
+
+def _data_hash(spec: PlotSpec, data: df) -> str:
+    """hashes the plotted data together with the spec, so that changing either re-renders the figure"""
+    digest = hashlib.sha256(json.dumps(asdict(spec), sort_keys=True).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    digest.update(",".join(map(str, data.columns)).encode())
+    return digest.hexdigest()
+
+
+def _use_agg_backend():
+    """process pool initializer: figures are only ever written to file"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(spec: PlotSpec, data: df, save_path: Path):
+    if spec.kind == "aggregate":
+        save_aggregate_box_plot(None, save_path, spec.groupby, df_long=data)
+    else:
+        save_per_model_box_plot(data, save_path, spec.groupby, spec.metric)
+
+
+def render_plots(
+        dataframe: df,
+        specs: list[PlotSpec],
+        out_dir: Path,
+        max_workers: int | None = None,
+        force: bool = False
+    ) -> list[Path]:
+    """
+    Renders a batch of figures in a process pool using the Agg backend.
+
+    The dataframe is melted once per groupby and shared between every aggregate figure of that
+    groupby. Figures whose input data hash matches the manifest of the previous render are
+    skipped, unless force is set. A manifest of every generated file is written to
+    out_dir / plot_manifest.json.
+        Args:
+            dataframe: dataframe as returned by initialize_dataframe_from_dir
+            specs: the figures to render
+            out_dir: directory the figures and manifest are written to
+            max_workers: number of worker processes, 1 renders in this process
+            force: re-render every figure regardless of the manifest
+
+        Returns:
+            the paths of the figures rendered by this call
+    """
+    for spec in specs:
+        assert spec.kind in ("aggregate", "per_model"), f"Error: unknown plot kind {spec.kind}."
+        assert spec.kind == "aggregate" or spec.metric is not None, f"Error: {spec.filename} requires a metric."
+
+    out_dir = Path(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+
+    manifest = {}
+    if manifest_path.is_file():
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f).get("files", {})
+
+    # melt once per groupby, slice once per per-model figure
+    melted = {spec.groupby: None for spec in specs if spec.kind == "aggregate"}
+    for groupby in melted:
+        melted[groupby] = melt_scores(dataframe, groupby)
+
+    jobs = []
+    for spec in specs:
+        if spec.kind == "aggregate":
+            data = melted[spec.groupby]
+        else:
+            data = dataframe[["model", spec.groupby, spec.metric]]
+
+        data_hash = _data_hash(spec, data)
+        save_path = out_dir / spec.filename
+        entry = manifest.get(spec.filename)
+        if not force and entry is not None and entry["hash"] == data_hash and save_path.is_file():
+            continue
+
+        manifest[spec.filename] = asdict(spec) | {"hash": data_hash}
+        jobs.append((spec, data, save_path))
+
+    if max_workers == 1 or len(jobs) <= 1:
+        _use_agg_backend()
+        for job in jobs:
+            _render(*job)
+    else:
+        with spawn_pool(max_workers, initializer=_use_agg_backend) as executor:
+            # consume the results to surface any rendering errors
+            list(executor.map(_render, *zip(*jobs)))
+
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"files": manifest}, f, indent=4)
+    os.replace(tmp_path, manifest_path)
+
+    rendered = [save_path for _, _, save_path in jobs]
+    print(f"Rendered {len(rendered)} of {len(specs)} figures to {out_dir}")
+    return rendered
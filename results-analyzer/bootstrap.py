@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+
+from .results_analyzer import METRICS
+
+
+def _resampling_units(dataframe: df, group_cols: list[str], metrics: list[str], cluster_col: str | None):
+    """
+    Collapses the rows of dataframe into resampling units.
+
+    A unit is a single row, or every row sharing a cluster_col value within a group when
+    cluster_col is given. Units are sorted by group so that each group occupies a contiguous
+    slice, which lets every group be resampled with a single index matrix.
+
+        Returns:
+            keys: index of group keys, in group code order
+            unit_group: group code of every unit
+            unit_sums: (units, metrics) sum of the non-nan metric values of every unit
+            unit_counts: (units, metrics) number of non-nan metric values of every unit
+    """
+    grouper = dataframe.groupby(group_cols, sort=True, dropna=False)
+    keys = grouper.size().index
+    group_codes = grouper.ngroup().to_numpy()
+
+    values = dataframe[metrics].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    row_sums = np.where(valid, values, 0.0)
+    row_counts = valid.astype(float)
+
+    if cluster_col is None:
+        cluster_codes = np.arange(len(dataframe))
+    else:
+        cluster_codes, _ = pd.factorize(dataframe[cluster_col], use_na_sentinel=False)
+
+    # one code per (group, cluster) pair; np.unique sorts them by group
+    pair_codes = group_codes.astype(np.int64) * (cluster_codes.max() + 1) + cluster_codes
+    unique_pairs, row_unit = np.unique(pair_codes, return_inverse=True)
+    unit_group = unique_pairs // (cluster_codes.max() + 1)
+
+    n_units = len(unique_pairs)
+    unit_sums = np.column_stack([np.bincount(row_unit, weights=row_sums[:, m], minlength=n_units) for m in range(len(metrics))])
+    unit_counts = np.column_stack([np.bincount(row_unit, weights=row_counts[:, m], minlength=n_units) for m in range(len(metrics))])
+
+    return keys, unit_group, unit_sums, unit_counts
+
+
+def _bootstrap_means(unit_group, unit_sums, unit_counts, n_resamples: int, rng, max_block_mb: float):
+    """
+    Draws n_resamples stratified bootstrap resamples of every group at once.
+
+    Resample index matrices are drawn in blocks sized so that a single block stays under
+    max_block_mb, so memory is bounded independently of n_resamples.
+
+        Returns:
+            (n_resamples, groups, metrics) array of resampled group means
+    """
+    n_units, n_metrics = unit_sums.shape
+    group_sizes = np.bincount(unit_group)
+    offsets = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+
+    # each slot of a resample draws a unit uniformly from the slot's own group
+    slot_offset = offsets[unit_group]
+    slot_size = group_sizes[unit_group]
+
+    # index matrix + gathered sums and counts
+    bytes_per_resample = n_units * 8 * (1 + 2 * n_metrics)
+    block_size = max(1, int(max_block_mb * 2**20 // bytes_per_resample))
+
+    means = np.empty((n_resamples, len(group_sizes), n_metrics))
+    for start in range(0, n_resamples, block_size):
+        stop = min(start + block_size, n_resamples)
+        index = slot_offset + rng.integers(0, slot_size, size=(stop - start, n_units))
+
+        sums = np.add.reduceat(unit_sums[index], offsets, axis=1)
+        counts = np.add.reduceat(unit_counts[index], offsets, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[start:stop] = sums / counts
+
+    return means
+
+
+def _jackknife_acceleration(unit_group, unit_sums, unit_counts):
+    """
+    Computes the BCa acceleration of every (group, metric) from leave-one-unit-out means.
+    """
+    offsets = np.concatenate(([0], np.flatnonzero(np.diff(unit_group)) + 1))
+    group_sums = np.add.reduceat(unit_sums, offsets, axis=0)
+    group_counts = np.add.reduceat(unit_counts, offsets, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jackknife = (group_sums[unit_group] - unit_sums) / (group_counts[unit_group] - unit_counts)
+        jackknife_mean = np.add.reduceat(np.nan_to_num(jackknife), offsets, axis=0) \
+            / np.add.reduceat((~np.isnan(jackknife)).astype(float), offsets, axis=0)
+        deviation = np.nan_to_num(jackknife_mean[unit_group] - jackknife)
+
+        numerator = np.add.reduceat(deviation ** 3, offsets, axis=0)
+        denominator = 6.0 * np.add.reduceat(deviation ** 2, offsets, axis=0) ** 1.5
+        acceleration = numerator / denominator
+
+    # groups with a single unit have no jackknife spread
+    return np.nan_to_num(acceleration, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _quantiles_per_cell(sorted_means, levels):
+    """
+    Linear-interpolated quantile of every (group, metric) cell at its own level.
+    sorted_means is sorted along axis 0; levels has shape (groups, metrics).
+    """
+    position = np.clip(levels, 0.0, 1.0) * (sorted_means.shape[0] - 1)
+    lower = np.floor(position).astype(np.intp)
+    upper = np.minimum(lower + 1, sorted_means.shape[0] - 1)
+    weight = position - lower
+
+    low_values = np.take_along_axis(sorted_means, lower[None], axis=0)[0]
+    high_values = np.take_along_axis(sorted_means, upper[None], axis=0)[0]
+    return low_values + weight * (high_values - low_values)
+
+
+def bootstrap_ci(
+        dataframe: df,
+        groupby: str | list[str],
+        metrics: list[str] = METRICS,
+        n_resamples: int = 10_000,
+        confidence: float = 0.95,
+        method: str = "percentile",
+        cluster_col: str | None = None,
+        seed: int | None = None,
+        max_block_mb: float = 64.0
+    ) -> df:
+    """
+    Computes bootstrap confidence intervals for the mean of every metric in every group.
+
+    Every group is resampled independently (stratified bootstrap), and all groups and metrics
+    are resampled together from a single block of NumPy index matrices.
+        Args:
+            dataframe: dataframe as returned by initialize_dataframe_from_dir
+            groupby: column, or list of columns, defining the groups (e.g. "model", ["model", "jailbreak"])
+            metrics: metric columns to compute intervals for
+            n_resamples: number of bootstrap resamples
+            confidence: two-sided confidence level of the interval
+            method: "percentile" or "bca" (bias-corrected and accelerated)
+            cluster_col: if set (e.g. "id"), rows sharing a value are resampled together, so that
+                rollouts of the same case are not treated as independent observations
+            seed: seed for the random generator, for reproducible intervals
+            max_block_mb: upper bound on the memory used by a single block of resamples
+
+        Returns:
+            tidy dataframe with one row per (group, metric) and the columns
+            [*groupby, metric, n, mean, ci_low, ci_high]
+    """
+    assert method in ("percentile", "bca"), f"Error: unknown bootstrap method {method}."
+    assert 0 < confidence < 1, "Error: confidence must be in (0, 1)."
+
+    group_cols = [groupby] if isinstance(groupby, str) else list(groupby)
+    keys, unit_group, unit_sums, unit_counts = _resampling_units(dataframe, group_cols, metrics, cluster_col)
+
+    rng = np.random.default_rng(seed)
+    means = _bootstrap_means(unit_group, unit_sums, unit_counts, n_resamples, rng, max_block_mb)
+
+    offsets = np.concatenate(([0], np.flatnonzero(np.diff(unit_group)) + 1))
+    group_sums = np.add.reduceat(unit_sums, offsets, axis=0)
+    group_counts = np.add.reduceat(unit_counts, offsets, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = group_sums / group_counts
+
+    alpha = (1 - confidence) / 2
+    if method == "percentile":
+        ci_low, ci_high = np.nanquantile(means, [alpha, 1 - alpha], axis=0)
+    else:
+        from scipy.special import ndtr, ndtri
+
+        # bias correction: fraction of resampled means below the observed mean
+        below = (means < observed).sum(axis=0) + 0.5 * (means == observed).sum(axis=0)
+        proportion = np.clip(below / n_resamples, 1 / (n_resamples + 1), n_resamples / (n_resamples + 1))
+        z0 = ndtri(proportion)
+        acceleration = _jackknife_acceleration(unit_group, unit_sums, unit_counts)
+
+        levels = []
+        for z_alpha in (ndtri(alpha), ndtri(1 - alpha)):
+            levels.append(ndtr(z0 + (z0 + z_alpha) / (1 - acceleration * (z0 + z_alpha))))
+
+        sorted_means = np.sort(means, axis=0)
+        ci_low = _quantiles_per_cell(sorted_means, levels[0])
+        ci_high = _quantiles_per_cell(sorted_means, levels[1])
+
+    rows = []
+    for g, key in enumerate(keys):
+        key = key if isinstance(key, tuple) else (key,)
+        for m, metric in enumerate(metrics):
+            rows.append(dict(zip(group_cols, key)) | {
+                "metric": metric,
+                "n": int(group_counts[g, m]),
+                "mean": observed[g, m],
+                "ci_low": ci_low[g, m],
+                "ci_high": ci_high[g, m],
+            })
+
+    return df(rows)
+
+
+def print_bootstrap_ci(dataframe: df, groupby: str | list[str], **kwargs):
+    """
+    Prints bootstrap confidence intervals for every group, in the style of kruskal_wallis.
+    kwargs are passed through to bootstrap_ci.
+    """
+    group_cols = [groupby] if isinstance(groupby, str) else list(groupby)
+    confidence = kwargs.get("confidence", 0.95)
+    method = kwargs.get("method", "percentile")
+
+    print(f"\n--- Bootstrap {confidence:.0%} CI ({method}): Grouped by {', '.join(group_cols).upper()} ---")
+    intervals = bootstrap_ci(dataframe, groupby, **kwargs)
+    with pd.option_context('display.max_rows', None,
+                           'display.expand_frame_repr', False,
+                           'display.precision', 4):
+        print(intervals)
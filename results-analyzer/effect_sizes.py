@@ -0,0 +1,132 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+
+from .results_analyzer import METRICS
+
+# Romano et al. (2006) thresholds for |Cliff's delta|
+MAGNITUDE_THRESHOLDS = [(0.147, "negligible"), (0.33, "small"), (0.474, "medium")]
+
+
+def _dominance_counts(a: np.ndarray, sorted_b: np.ndarray) -> tuple[int, int]:
+    """
+    Counts the pairs (x, y), x in a and y in sorted_b, with x > y and with x < y.
+    Uses searchsorted, so it runs in O(len(a) log len(b)) instead of comparing every pair.
+    """
+    below = np.searchsorted(sorted_b, a, side="left")
+    below_or_equal = np.searchsorted(sorted_b, a, side="right")
+    greater = int(below.sum())
+    less = int((len(sorted_b) - below_or_equal).sum())
+    return greater, less
+
+
+def cliffs_delta(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Cliff's delta, P(a > b) - P(a < b), of two samples. nan values are dropped.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    a, b = a[~np.isnan(a)], np.sort(b[~np.isnan(b)])
+    if len(a) == 0 or len(b) == 0:
+        return np.nan
+
+    greater, less = _dominance_counts(a, b)
+    return (greater - less) / (len(a) * len(b))
+
+
+def magnitude(delta: float) -> str:
+    """labels |delta| using the Romano et al. thresholds"""
+    if np.isnan(delta):
+        return ""
+    for threshold, label in MAGNITUDE_THRESHOLDS:
+        if abs(delta) < threshold:
+            return label
+    return "large"
+
+
+def pairwise_effect_sizes(
+        dataframe: df,
+        factor: str,
+        metrics: list[str] = METRICS,
+        within: str | None = None
+    ) -> df:
+    """
+    Computes effect sizes between every pair of levels of 'factor' for every metric,
+    optionally separately within every level of 'within' (e.g. every jailbreak pair within every model).
+
+    Each level's values are sorted once and every pair is compared with searchsorted,
+    so a pair costs O(n log n) rather than O(n^2).
+        Args:
+            dataframe: dataframe as returned by initialize_dataframe_from_dir
+            factor: column whose levels are compared (e.g. "jailbreak")
+            metrics: metric columns to compare
+            within: optional column to stratify by (e.g. "model")
+
+        Returns:
+            tidy dataframe with one row per ([within,] metric, level_a, level_b) and the columns
+            n_a, n_b, cliffs_delta, prob_superiority, rank_biserial, magnitude.
+            prob_superiority is P(a > b) + P(a = b) / 2; for two independent samples the
+            rank-biserial correlation 2 * prob_superiority - 1 equals Cliff's delta.
+    """
+    strata = [(None, dataframe)] if within is None else list(dataframe.groupby(by=within))
+
+    rows = []
+    for stratum, subset in strata:
+        for metric in metrics:
+            levels = {
+                level: np.sort(group[metric].dropna().to_numpy(dtype=float))
+                for level, group in subset.groupby(by=factor)
+            }
+
+            for level_a, level_b in combinations(levels, 2):
+                a, b = levels[level_a], levels[level_b]
+                if len(a) == 0 or len(b) == 0:
+                    continue
+
+                greater, less = _dominance_counts(a, b)
+                n_pairs = len(a) * len(b)
+                delta = (greater - less) / n_pairs
+                prob_superiority = (greater + (n_pairs - greater - less) / 2) / n_pairs
+
+                row = {} if within is None else {within: stratum}
+                rows.append(row | {
+                    "metric": metric,
+                    "level_a": level_a,
+                    "level_b": level_b,
+                    "n_a": len(a),
+                    "n_b": len(b),
+                    "cliffs_delta": delta,
+                    "prob_superiority": prob_superiority,
+                    "rank_biserial": 2 * prob_superiority - 1,
+                    "magnitude": magnitude(delta),
+                })
+
+    return df(rows)
+
+
+def effect_size_matrix(effect_sizes: df, metric: str, value: str = "cliffs_delta") -> df:
+    """
+    Pivots the output of pairwise_effect_sizes into a square level_a x level_b matrix for one metric.
+    Entry (i, j) is the effect of level i over level j, so delta matrices are antisymmetric.
+    When pairwise_effect_sizes was stratified, filter effect_sizes to a single stratum first.
+    """
+    assert value in ("cliffs_delta", "rank_biserial", "prob_superiority"), f"Error: {value} is not a pairwise effect size."
+    signed = value != "prob_superiority"
+
+    # the effect of b over a is the negated delta, or the complementary probability
+    subset = effect_sizes[effect_sizes["metric"] == metric]
+    mirrored = subset.rename(columns={"level_a": "level_b", "level_b": "level_a"})
+    mirrored = mirrored.assign(**{value: -mirrored[value] if signed else 1 - mirrored[value]})
+
+    levels = sorted(set(subset["level_a"]) | set(subset["level_b"]))
+    matrix = pd.concat([subset, mirrored]).pivot(index="level_a", columns="level_b", values=value)
+    matrix = matrix.reindex(index=levels, columns=levels)
+
+    # a level compared with itself has no effect
+    for level in levels:
+        matrix.loc[level, level] = 0.0 if signed else 0.5
+
+    matrix.index.name = None
+    matrix.columns.name = None
+    return matrix
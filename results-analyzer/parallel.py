@@ -0,0 +1,18 @@
+"""
+Process pools for the analyses and the case validation that run in worker processes.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(max_workers: int | None = None, **kwargs) -> ProcessPoolExecutor:
+    """
+    A ProcessPoolExecutor whose workers are spawned rather than forked. Pools are started from
+    runner threads, or after datasets and pyarrow have started theirs, and forking a
+    multi-threaded process can deadlock.
+        Args:
+            max_workers: number of worker processes, defaults to the number of CPUs
+            kwargs: passed on to ProcessPoolExecutor, e.g. initializer and initargs
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"), **kwargs)
@@ -0,0 +1,186 @@
+import math
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+
+from .parallel import spawn_pool
+from .results_analyzer import METRICS
+
+
+def _sequential_bounds(exceedances: int, n_permutations: int, risk: float) -> tuple[float, float]:
+    """
+    Clopper-Pearson bounds on the permutation p-value after n_permutations draws.
+    """
+    from scipy import stats
+
+    lower = stats.beta.ppf(risk / 2, exceedances, n_permutations - exceedances + 1) if exceedances > 0 else 0.0
+    upper = stats.beta.ppf(1 - risk / 2, exceedances + 1, n_permutations - exceedances) if exceedances < n_permutations else 1.0
+    return lower, upper
+
+
+def permutation_kruskal_test(
+        values: np.ndarray,
+        labels: np.ndarray,
+        alpha: float = 0.05,
+        batch_size: int = 1000,
+        max_permutations: int = 100_000,
+        risk: float = 1e-3,
+        seed: int | np.random.SeedSequence | None = None
+    ) -> dict | None:
+    """
+    Monte Carlo permutation version of the Kruskal-Wallis H-test.
+
+    Ranks are computed once; each batch permutes the ranks across groups and recomputes the
+    rank sums with a single reduceat. After every batch a Clopper-Pearson interval on the
+    p-value is checked, and sampling stops as soon as the interval lies entirely above or below
+    alpha. The interval level is split over the maximum number of batches, so the probability
+    that early stopping reaches a different decision than the full run is at most risk.
+        Args:
+            values: metric values, nan values are dropped
+            labels: group label of every value
+            alpha: significance level the early stopping decides against
+            batch_size: number of permutations generated per vectorized batch
+            max_permutations: upper bound on the number of permutations
+            risk: resampling risk of the sequential stopping rule, 0 disables early stopping
+            seed: seed for the random generator
+
+        Returns:
+            dict with h_statistic, p_value, n_permutations and stopped_early,
+            or None when fewer than two groups are present
+    """
+    from scipy import stats
+
+    values = np.asarray(values, dtype=float)
+    labels = np.asarray(labels)
+    keep = ~np.isnan(values)
+    values, labels = values[keep], labels[keep]
+
+    codes, uniques = pd.factorize(labels)
+    if len(uniques) < 2:
+        return None
+
+    # sort by group so that every group is a contiguous slice of the rank vector
+    order = np.argsort(codes, kind="stable")
+    ranks = stats.rankdata(values)[order]
+    group_sizes = np.bincount(codes)
+    offsets = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+    n = len(ranks)
+
+    # sum(R_g^2 / n_g) is a monotone transform of H for a fixed set of ranks
+    observed = np.sum(np.add.reduceat(ranks, offsets) ** 2 / group_sizes)
+    tolerance = observed * 1e-12
+
+    tie_correction = stats.tiecorrect(ranks)
+    h_statistic = (12.0 / (n * (n + 1)) * observed - 3 * (n + 1)) / tie_correction if tie_correction > 0 else 0.0
+
+    rng = np.random.default_rng(seed)
+    max_batches = math.ceil(max_permutations / batch_size)
+    exceedances = 0
+    n_permutations = 0
+    while n_permutations < max_permutations:
+        size = min(batch_size, max_permutations - n_permutations)
+        permuted = rng.permuted(np.tile(ranks, (size, 1)), axis=1)
+        permuted_stats = np.sum(np.add.reduceat(permuted, offsets, axis=1) ** 2 / group_sizes, axis=1)
+
+        exceedances += int(np.count_nonzero(permuted_stats >= observed - tolerance))
+        n_permutations += size
+
+        if risk > 0:
+            lower, upper = _sequential_bounds(exceedances, n_permutations, risk / max_batches)
+            if upper < alpha or lower > alpha:
+                break
+
+    return {
+        "h_statistic": h_statistic,
+        "p_value": (exceedances + 1) / (n_permutations + 1),
+        "n_permutations": n_permutations,
+        "stopped_early": n_permutations < max_permutations,
+    }
+
+
+def _run_test(task: tuple) -> dict | None:
+    """unpacks a (values, labels, kwargs) task for the process pool"""
+    values, labels, kwargs = task
+    return permutation_kruskal_test(values, labels, **kwargs)
+
+
+def _run_tests(tasks: list[tuple], max_workers: int | None) -> list:
+    """runs the tasks across processes, or inline when max_workers is 1"""
+    if max_workers == 1 or len(tasks) <= 1:
+        return [_run_test(task) for task in tasks]
+
+    with spawn_pool(max_workers) as executor:
+        return list(executor.map(_run_test, tasks))
+
+
+def permutation_kruskal(
+        dataframe: df,
+        variable: str,
+        metrics: list[str] = METRICS,
+        alpha: float = 0.05,
+        seed: int | None = None,
+        max_workers: int | None = None,
+        **kwargs
+    ) -> df:
+    """
+    Permutation Kruskal-Wallis test of every metric across the groups defined by 'variable'.
+    One test runs per metric, spread across max_workers processes.
+    kwargs are passed through to permutation_kruskal_test.
+
+        Returns:
+            dataframe with one row per metric
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(metrics))
+    tasks = [
+        (dataframe[metric].to_numpy(), dataframe[variable].to_numpy(), kwargs | {"alpha": alpha, "seed": s})
+        for metric, s in zip(metrics, seeds)
+    ]
+
+    rows = []
+    for metric, result in zip(metrics, _run_tests(tasks, max_workers)):
+        if result is None:
+            print(f"Skipping {metric}: Not enough groups in {variable}.")
+            continue
+        rows.append({"variable": variable, "metric": metric} | result | {"significant": result["p_value"] < alpha})
+
+    return df(rows)
+
+
+def permutation_confounding(
+        dataframe: df,
+        target_var: str,
+        confounder_var: str,
+        metrics: list[str] = METRICS,
+        alpha: float = 0.05,
+        seed: int | None = None,
+        max_workers: int | None = None,
+        **kwargs
+    ) -> df:
+    """
+    Permutation counterpart of check_confounding: tests the effect of target_var (e.g. 'jailbreak')
+    within every level of confounder_var (e.g. 'model'). Small cells are where the asymptotic
+    Kruskal-Wallis p-value is least reliable, so every (level, metric) cell is tested by permutation.
+    kwargs are passed through to permutation_kruskal_test.
+
+        Returns:
+            dataframe with one row per (confounder level, metric)
+    """
+    cells = [
+        (level, metric, subset)
+        for level, subset in dataframe.groupby(by=confounder_var)
+        for metric in metrics
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(cells))
+    tasks = [
+        (subset[metric].to_numpy(), subset[target_var].to_numpy(), kwargs | {"alpha": alpha, "seed": s})
+        for (level, metric, subset), s in zip(cells, seeds)
+    ]
+
+    rows = []
+    for (level, metric, subset), result in zip(cells, _run_tests(tasks, max_workers)):
+        if result is None:
+            print(f"   Metric: {metric:8} | Not enough {target_var} variety in {confounder_var} {level}.")
+            continue
+        rows.append({confounder_var: level, "variable": target_var, "metric": metric} | result | {"significant": result["p_value"] < alpha})
+
+    return df(rows)
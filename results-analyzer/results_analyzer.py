@@ -3,17 +3,21 @@ import numpy as np
 from pandas import DataFrame as df
 import pandas as pd
 from pathlib import Path
-import seaborn as sns
-import matplotlib.pyplot as plt
 
-from scipy import stats
-import scikit_posthocs as sp # You may need to pip install scikit-posthocs
+# seaborn, matplotlib, scipy and scikit_posthocs take seconds to import, so they are imported
+# by the tests and plots that use them, and runs that only ingest results do not pay for them
+
+# per-case summary scores produced by process_single_file
+METRICS = ["avg_dcs", "avg_hes", "avg_sis"]
 
 def check_confounding(dataframe, target_var, confounder_var):
     """
     Checks if the effect of target_var (e.g., 'jailbreak') is consistent 
     across different levels of confounder_var (e.g., 'model').
     """
+    from scipy import stats
+    import scikit_posthocs as sp # You may need to pip install scikit-posthocs
+
     metrics = ["avg_dcs", "avg_hes", "avg_sis"]
     
     print(f"\n{'='*60}")
@@ -55,6 +59,9 @@ def kruskal_wallis(dataframe: df, variable: str, dunn: bool = True):
     Performs Kruskal-Wallis H-test for avg_dcs, avg_hes, and avg_sis
     across the groups defined by 'variable'.
     """
+    from scipy import stats
+    import scikit_posthocs as sp # You may need to pip install scikit-posthocs
+
     metrics = ["avg_dcs", "avg_hes", "avg_sis"]
     
     print(f"\n--- Kruskal-Wallis Analysis: Grouped by {variable.upper()} ---")
@@ -90,18 +97,28 @@ def kruskal_wallis(dataframe: df, variable: str, dunn: bool = True):
         else:
             print(f"   [-] NOT SIGNIFICANT: No evidence that {variable} impacts {metric}.")
 
-def save_aggregate_box_plot(dataframe: df, save_path: Path, groupby: str):
+def melt_scores(dataframe: df, groupby: str) -> df:
     """
-    saves a box plot of the groupby statistic as the x, the metric as the hue.
+    melts the metric columns into long format, with one (groupby, Metric, Avg Score) row per score
     """
-
-    df_long = dataframe.melt(
+    return dataframe.melt(
         id_vars=[groupby], 
         value_vars=["avg_dcs", "avg_hes", "avg_sis"], 
         var_name='Metric', 
         value_name='Avg Score'
     )
 
+def save_aggregate_box_plot(dataframe: df, save_path: Path, groupby: str, df_long: df | None = None):
+    """
+    saves a box plot of the groupby statistic as the x, the metric as the hue.
+    df_long may be passed if the dataframe has already been melted with melt_scores.
+    """
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
+    if df_long is None:
+        df_long = melt_scores(dataframe, groupby)
+
     plt.figure(figsize=(12, 6))
     sns.set_theme(style="whitegrid")
 
@@ -128,6 +145,8 @@ def save_per_model_box_plot(dataframe: df, save_path: Path, groupby: str, metric
     saves a box plot to a given path
     uses model as x axis, 
     """
+    import seaborn as sns
+    import matplotlib.pyplot as plt
 
     plt.figure(figsize=(12, 6))
     sns.set_theme(style="whitegrid")
@@ -151,6 +170,35 @@ def save_per_model_box_plot(dataframe: df, save_path: Path, groupby: str, metric
     plt.savefig(save_path)
     plt.close()
 
+def save_effect_size_heatmap(matrix: df, save_path: Path, title: str, value: str = "cliffs_delta"):
+    """
+    saves a heatmap of a square effect size matrix, as returned by effect_sizes.effect_size_matrix
+    """
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
+    signed = value != "prob_superiority"
+
+    plt.figure(figsize=(10, 8))
+    sns.set_theme(style="white")
+
+    sns.heatmap(
+        matrix,
+        annot=True,
+        fmt=".2f",
+        cmap="vlag",
+        center=0.0 if signed else 0.5,
+        vmin=-1.0 if signed else 0.0,
+        vmax=1.0,
+        square=True,
+        cbar_kws={"label": value.replace('_', ' ').capitalize()}
+    )
+
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close()
+
 def process_single_file(data_dict : dict, file: Path):
     """
     Adds summary data to data_dict
@@ -184,6 +232,15 @@ def initialize_dataframe_from_dir(dir_path: Path) -> df:
             dir_path: directory path
     """
     assert not dir_path.is_file(), f"Error: {dir_path.name} must be a directory."
+    files = [file for file in dir_path.iterdir() if file.is_file() and file.suffix == ".json"]
+    return initialize_dataframe_from_files(files)
+
+def initialize_dataframe_from_files(files: list[Path]) -> df:
+    """
+    Initializes a dataframe from a list of result files
+        Args:
+            files: paths of psychosis-bench result json files
+    """
     # data dictionary for which each row represents a single test run
     # also will add any additional element provided
     data_dict = {
@@ -194,9 +251,8 @@ def initialize_dataframe_from_dir(dir_path: Path) -> df:
         "condition" : [],
         "harm_type": []
     }
-    for file in dir_path.iterdir():
-        if file.is_file() and file.suffix == ".json":
-            process_single_file(data_dict, file)
+    for file in files:
+        process_single_file(data_dict, file)
         
     assert len(set((len(v) for v in data_dict.values()))) == 1, "Error: missing values for some parameter."
     return df(data_dict)
@@ -216,6 +272,10 @@ def main():
     # save_aggregate_box_plot(dataframe, results_dir / "aggregate_scores_jailbreak.png", "jailbreak")
     # save_aggregate_box_plot(dataframe, results_dir / "aggregate_scores_model.png", "model")
 
+    # # or render every report figure at once, skipping figures whose data has not changed
+    # from .batch_plots import render_plots, report_plot_specs
+    # render_plots(dataframe, report_plot_specs(), results_dir)
+
     # ---KRUSKAL WALLIS---
     kruskal_wallis(dataframe, "jailbreak")
     # kruskal_wallis(dataframe, "model")
@@ -0,0 +1,281 @@
+"""
+Declarative, single-pass analysis runner.
+
+Reads an analysis spec (see analysis_spec.yaml), loads the results once, and runs every
+requested analysis against a shared AnalysisContext, writing one table per analysis.
+
+    uv run -m results-analyzer.runner results-analyzer/analysis_spec.yaml
+"""
+
+import os
+import json
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+
+from .results_analyzer import METRICS, initialize_dataframe_from_dir
+from .bootstrap import bootstrap_ci
+from .permutation import permutation_confounding
+from .effect_sizes import pairwise_effect_sizes
+from .batch_plots import PlotSpec, render_plots, report_plot_specs
+
+
+class AnalysisContext:
+    """
+    Holds the dataframe together with lazily computed group codes and ranks. The codes and
+    ranks are shared by the kruskal analyses of a spec; the other analyses group the dataframe
+    themselves.
+    """
+
+    def __init__(self, dataframe: df):
+        self.dataframe = dataframe
+        self._codes = {}
+        self._ranks = {}
+        self._lock = threading.Lock()
+
+    def codes(self, variable: str) -> tuple[np.ndarray, np.ndarray]:
+        """returns (codes, levels) of variable, with levels sorted and -1 for missing labels"""
+        with self._lock:
+            if variable not in self._codes:
+                self._codes[variable] = pd.factorize(self.dataframe[variable], sort=True)
+            return self._codes[variable]
+
+    def ranks(self, metric: str) -> np.ndarray:
+        """returns the ranks of metric over all of its non-nan values, nan where the value is missing"""
+        with self._lock:
+            if metric not in self._ranks:
+                from scipy import stats
+                values = self.dataframe[metric].to_numpy(dtype=float)
+                self._ranks[metric] = stats.rankdata(values, nan_policy="omit")
+            return self._ranks[metric]
+
+
+def _results_manifest(results_dir: Path) -> dict:
+    """identifies the ingested results: the resolved directory and the name, mtime and size of every result file"""
+    files = sorted(
+        [file.name, stat.st_mtime_ns, stat.st_size]
+        for file in results_dir.iterdir() if file.is_file() and file.suffix == ".json"
+        for stat in [file.stat()]
+    )
+    return {"results_dir": str(results_dir.resolve()), "files": files}
+
+
+def load_dataframe(results_dir: Path, cache: Path | None = None) -> df:
+    """
+    Loads the results dataframe, ingesting results_dir unless the cache was written from the
+    same directory and the same result files. The result files are recorded in a sidecar
+    manifest next to the cache, so added, deleted or rewritten files, including files copied
+    with their modification times preserved, invalidate it. The cache format (.csv or .parquet)
+    follows its suffix, and defaults to parquet.
+    """
+    results_dir = Path(results_dir)
+    if cache is not None:
+        cache = Path(cache)
+        if cache.suffix not in (".csv", ".parquet"):
+            cache = cache.with_name(cache.name + ".parquet")
+        manifest_path = cache.with_name(cache.name + ".manifest.json")
+        manifest = _results_manifest(results_dir)
+
+        cached = None
+        if cache.is_file() and manifest_path.is_file():
+            with open(manifest_path, 'r') as f:
+                cached = json.load(f)
+        if cached is not None and {k: cached.get(k) for k in manifest} == manifest:
+            print(f"Loading cached results from {cache}")
+            if cache.suffix == ".parquet":
+                return pd.read_parquet(cache)
+            # csv does not keep dtypes, e.g. string ids would be read back as ints
+            return pd.read_csv(cache, dtype={column: str for column in cached["string_columns"]})
+
+    dataframe = initialize_dataframe_from_dir(results_dir)
+    if cache is not None:
+        os.makedirs(cache.parent, exist_ok=True)
+        write_table(dataframe, cache.with_suffix(""), cache.suffix.removeprefix("."))
+        manifest["string_columns"] = [column for column in dataframe.columns if pd.api.types.is_string_dtype(dataframe[column])]
+        tmp_path = manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, manifest_path)
+    return dataframe
+
+
+def write_table(table: df, path: Path, file_format: str) -> Path:
+    """writes table to path with the suffix of file_format"""
+    path = path.with_suffix(f".{file_format}")
+    if file_format == "parquet":
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+    return path
+
+
+def run_kruskal(context: AnalysisContext, spec: dict) -> dict[str, df]:
+    """
+    Kruskal-Wallis H-test of every metric across every variable, computed from the shared ranks.
+    Dunn's post-hoc test is added for every significant result unless dunn is false.
+    """
+    from scipy import stats
+    import scikit_posthocs as sp
+
+    alpha = spec.get("alpha", 0.05)
+    metrics = spec.get("metrics", METRICS)
+
+    rows = []
+    posthocs = []
+    for variable in spec["variables"]:
+        codes, levels = context.codes(variable)
+        for metric in metrics:
+            ranks = context.ranks(metric)
+            valid = ~np.isnan(ranks)
+            if np.any(codes[valid] == -1):
+                # rows without a label are dropped, so the shared ranks no longer apply
+                valid &= codes != -1
+                ranks = np.full(len(ranks), np.nan)
+                ranks[valid] = stats.rankdata(context.dataframe[metric].to_numpy(dtype=float)[valid])
+
+            group_sizes = np.bincount(codes[valid], minlength=len(levels))
+            rank_sums = np.bincount(codes[valid], weights=ranks[valid], minlength=len(levels))
+            present = group_sizes > 0
+            if present.sum() < 2:
+                continue
+
+            n = valid.sum()
+            h_stat = 12.0 / (n * (n + 1)) * np.sum(rank_sums[present] ** 2 / group_sizes[present]) - 3 * (n + 1)
+            tie_correction = stats.tiecorrect(ranks[valid])
+            h_stat = h_stat / tie_correction if tie_correction > 0 else 0.0
+            p_val = stats.chi2.sf(h_stat, present.sum() - 1)
+
+            rows.append({"variable": variable, "metric": metric, "h_statistic": h_stat, "p_value": p_val, "significant": p_val < alpha})
+
+            if p_val < alpha and spec.get("dunn", True):
+                posthoc = sp.posthoc_dunn(context.dataframe, val_col=metric, group_col=variable, p_adjust='holm')
+                posthoc = posthoc.rename_axis(index="level_a", columns="level_b").stack().rename("p_value").reset_index()
+                posthocs.append(posthoc.assign(variable=variable, metric=metric))
+
+    tables = {"kruskal": df(rows)}
+    if posthocs:
+        tables["kruskal_dunn"] = pd.concat(posthocs, ignore_index=True)
+    return tables
+
+
+def run_confounding(context: AnalysisContext, spec: dict) -> dict[str, df]:
+    """
+    Effect of target within every level of confounder, by permutation or by the asymptotic test.
+    """
+    from scipy import stats
+
+    dataframe = context.dataframe
+    target, confounder = spec["target"], spec["confounder"]
+    metrics = spec.get("metrics", METRICS)
+    alpha = spec.get("alpha", 0.05)
+
+    if spec.get("permutation", False):
+        options = {k: v for k, v in spec.items() if k in ("seed", "max_permutations", "batch_size", "risk", "max_workers")}
+        table = permutation_confounding(dataframe, target, confounder, metrics, alpha=alpha, **options)
+    else:
+        rows = []
+        for level, subset in dataframe.groupby(by=confounder):
+            for metric in metrics:
+                groups = [group[metric].dropna().values for name, group in subset.groupby(by=target)]
+                if len(groups) < 2:
+                    continue
+                h_stat, p_val = stats.kruskal(*groups)
+                rows.append({confounder: level, "variable": target, "metric": metric, "h_statistic": h_stat, "p_value": p_val, "significant": p_val < alpha})
+        table = df(rows)
+
+    return {f"confounding_{target}_by_{confounder}": table}
+
+
+def run_bootstrap(context: AnalysisContext, spec: dict) -> dict[str, df]:
+    groupby = spec["groupby"]
+    group_cols = [groupby] if isinstance(groupby, str) else groupby
+    options = {k: v for k, v in spec.items() if k in ("metrics", "n_resamples", "confidence", "method", "cluster_col", "seed", "max_block_mb")}
+    return {f"bootstrap_{'_'.join(group_cols)}": bootstrap_ci(context.dataframe, groupby, **options)}
+
+
+def run_effect_sizes(context: AnalysisContext, spec: dict) -> dict[str, df]:
+    factor, within = spec["factor"], spec.get("within")
+    name = f"effect_sizes_{factor}" + (f"_within_{within}" if within else "")
+    return {name: pairwise_effect_sizes(context.dataframe, factor, spec.get("metrics", METRICS), within)}
+
+
+def run_plots(context: AnalysisContext, spec: dict, figures_dir: Path) -> dict[str, df]:
+    if "specs" in spec:
+        specs = [PlotSpec(**plot) for plot in spec["specs"]]
+    else:
+        specs = report_plot_specs(spec.get("groupbys", ["jailbreak", "model"]), spec.get("metrics", METRICS))
+
+    rendered = render_plots(context.dataframe, specs, figures_dir, spec.get("max_workers"), spec.get("force", False))
+    return {"figures": df({"file": [str(figures_dir / s.filename) for s in specs],
+                           "rendered": [figures_dir / s.filename in rendered for s in specs]})}
+
+
+ANALYSES = {
+    "kruskal": run_kruskal,
+    "confounding": run_confounding,
+    "bootstrap": run_bootstrap,
+    "effect_sizes": run_effect_sizes,
+}
+
+
+def run_spec(spec: dict) -> dict[str, Path]:
+    """
+    Runs every analysis of spec and writes its tables to the output directory.
+
+        Returns:
+            dict of table name to the file it was written to
+    """
+    output_dir = Path(spec["output_dir"])
+    file_format = spec.get("format", "csv")
+    assert file_format in ("csv", "parquet"), f"Error: unknown output format {file_format}."
+    for analysis in spec["analyses"]:
+        assert analysis["type"] in ANALYSES or analysis["type"] == "plots", f"Error: unknown analysis type {analysis['type']}."
+
+    data = spec["data"]
+    context = AnalysisContext(load_dataframe(Path(data["results_dir"]), data.get("cache")))
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run(analysis: dict) -> dict[str, df]:
+        if analysis["type"] == "plots":
+            return run_plots(context, analysis, output_dir / "figures")
+        return ANALYSES[analysis["type"]](context, analysis)
+
+    # matplotlib (also imported by scikit_posthocs) is imported lazily, and importing it from
+    # several threads at once can expose a partially initialized matplotlib.pyplot
+    if any(analysis["type"] in ("kruskal", "plots") for analysis in spec["analyses"]):
+        import matplotlib.pyplot
+
+    # analyses are independent of each other; the heavy ones release the GIL or use their own spawned process pool
+    with ThreadPoolExecutor(max_workers=spec.get("max_workers")) as executor:
+        results = list(executor.map(run, spec["analyses"]))
+
+    outputs = {}
+    for analysis, tables in zip(spec["analyses"], results):
+        for name, table in tables.items():
+            name = analysis.get("name", name) if len(tables) == 1 else name
+            outputs[name] = write_table(table, output_dir / name, file_format)
+            print(f"Saved {analysis['type']} results to {outputs[name]}")
+
+    with open(output_dir / "run_manifest.json", 'w', encoding='utf-8') as f:
+        json.dump({"spec": spec, "outputs": {k: str(v) for k, v in outputs.items()}}, f, indent=4)
+
+    return outputs
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Runs the analyses listed in an analysis spec.")
+    parser.add_argument("spec", type=Path, help="path to the analysis spec yaml")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as f:
+        spec = yaml.safe_load(f)
+    run_spec(spec)
+
+
+if __name__ == '__main__':
+    main()
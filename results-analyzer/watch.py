@@ -0,0 +1,251 @@
+"""
+Watch mode for the results analyzer.
+
+Polls a results directory during a long psychosis-bench sweep, ingests only the result files
+that appeared since the last poll, and updates per-group running statistics and a summary table
+incrementally, at a cost proportional to the new rows. Every figure shows all groups, so the key
+plots are re-melted, re-hashed and re-rendered from the whole accumulated dataframe on every
+poll that ingests new rows; pass --no-plots or a longer --interval for very large sweeps.
+
+    uv run -m results-analyzer.watch outputs/experiment-subset/results --groupby model jailbreak
+"""
+
+import os
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+
+from .results_analyzer import METRICS, initialize_dataframe_from_files
+from .batch_plots import render_plots, report_plot_specs
+
+
+class RunningStats:
+    """
+    Count, mean and variance of a stream of values (Welford), mergeable with Chan's update.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values: np.ndarray):
+        """adds a batch of values, nan values are ignored"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        batch = RunningStats()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        self.merge(batch)
+
+    def merge(self, other: "RunningStats"):
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        """sample variance"""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+
+class HistogramSketch:
+    """
+    Mergeable rank sketch over a bounded score range: a fixed-bin histogram, so merging two
+    sketches is adding their counts, and quantiles are exact up to the bin width.
+    Scores are averages of 0 - 2 turn scores, so the default range covers every value.
+    """
+
+    def __init__(self, low: float = 0.0, high: float = 2.0, bins: int = 200):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        values = np.clip(values[~np.isnan(values)], self.edges[0], self.edges[-1])
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    def merge(self, other: "HistogramSketch"):
+        assert np.array_equal(self.edges, other.edges), "Error: sketches must share their bins to be merged."
+        self.counts += other.counts
+
+    def quantile(self, q: float) -> float:
+        """approximate q-quantile, interpolated linearly within the bin that contains it"""
+        total = self.counts.sum()
+        if total == 0:
+            return np.nan
+        cumulative = np.cumsum(self.counts)
+        target = q * total
+        i = min(int(np.searchsorted(cumulative, target, side="left")), len(self.counts) - 1)
+        before = cumulative[i - 1] if i > 0 else 0
+        fraction = (target - before) / self.counts[i] if self.counts[i] > 0 else 0.0
+        return float(self.edges[i] + fraction * (self.edges[i + 1] - self.edges[i]))
+
+    def rank(self, value: float) -> float:
+        """approximate fraction of values <= value"""
+        total = self.counts.sum()
+        if total == 0:
+            return np.nan
+        i = int(np.searchsorted(self.edges, value, side="right")) - 1
+        i = min(max(i, 0), len(self.counts) - 1)
+        within = (value - self.edges[i]) / (self.edges[i + 1] - self.edges[i])
+        return float((self.counts[:i].sum() + min(within, 1.0) * self.counts[i]) / total)
+
+
+class GroupAggregates:
+    """
+    Running statistics and rank sketches per (groupby column, level, metric).
+    """
+
+    def __init__(self, groupbys: list[str], metrics: list[str] = METRICS):
+        self.groupbys = groupbys
+        self.metrics = metrics
+        self.stats = {}
+        self.sketches = {}
+
+    def update(self, dataframe: df):
+        """folds a batch of new rows into the aggregates"""
+        for groupby in self.groupbys:
+            for level, group in dataframe.groupby(by=groupby):
+                for metric in self.metrics:
+                    key = (groupby, level, metric)
+                    values = group[metric].to_numpy(dtype=float)
+                    self.stats.setdefault(key, RunningStats()).update(values)
+                    self.sketches.setdefault(key, HistogramSketch()).update(values)
+
+    def summary(self) -> df:
+        rows = []
+        for (groupby, level, metric), running in sorted(self.stats.items(), key=lambda item: tuple(map(str, item[0]))):
+            sketch = self.sketches[(groupby, level, metric)]
+            rows.append({
+                "groupby": groupby,
+                "level": level,
+                "metric": metric,
+                "n": running.count,
+                "mean": running.mean if running.count else np.nan,
+                "std": np.sqrt(running.variance),
+                "q25": sketch.quantile(0.25),
+                "median": sketch.quantile(0.5),
+                "q75": sketch.quantile(0.75),
+            })
+        return df(rows)
+
+
+class ResultsWatcher:
+    """
+    Ingests new result files from results_dir and keeps the aggregates, summary and plots up to date.
+    A file is only ingested once its modification time is at least settle_seconds old,
+    so that files still being written by psychosis-bench are picked up on a later poll.
+    Files that cannot be ingested, e.g. truncated ones, are skipped with a warning and retried
+    once their modification time or size changes. Files are ingested once: rewriting a file
+    after it was ingested does not update the aggregates.
+    """
+
+    def __init__(self, results_dir: Path, out_dir: Path, groupbys: list[str], plots: bool = True, settle_seconds: float = 2.0):
+        self.results_dir = Path(results_dir)
+        self.out_dir = Path(out_dir)
+        self.groupbys = groupbys
+        self.plots = plots
+        self.settle_seconds = settle_seconds
+
+        self.aggregates = GroupAggregates(groupbys)
+        self.dataframe = None
+        self.seen = set()
+        # (mtime, size) of the files that failed to ingest, as of their last attempt
+        self.failed = {}
+
+    def new_files(self) -> list[Path]:
+        now = time.time()
+        files = []
+        for file in self.results_dir.iterdir():
+            if not file.is_file() or file.suffix != ".json" or file in self.seen:
+                continue
+            stat = file.stat()
+            if now - stat.st_mtime >= self.settle_seconds and self.failed.get(file) != (stat.st_mtime_ns, stat.st_size):
+                files.append(file)
+        return sorted(files)
+
+    def ingest(self, files: list[Path]) -> list[df]:
+        """reads the files one by one, so that a file that fails to ingest does not block the others"""
+        batches = []
+        for file in files:
+            stat = file.stat()
+            try:
+                batches.append(initialize_dataframe_from_files([file]))
+            except Exception as e:
+                print(f"Warning: could not ingest {file}, retrying once it changes: {e!r}")
+                self.failed[file] = (stat.st_mtime_ns, stat.st_size)
+                continue
+            self.failed.pop(file, None)
+            self.seen.add(file)
+        return batches
+
+    def poll(self) -> int:
+        """
+        Ingests the new files, if any, and refreshes the outputs.
+            Returns:
+                the number of rows ingested
+        """
+        files = self.new_files()
+        batches = self.ingest(files)
+        if not batches:
+            return 0
+
+        batch = pd.concat(batches, ignore_index=True)
+        self.aggregates.update(batch)
+        self.dataframe = batch if self.dataframe is None else pd.concat([self.dataframe, batch], ignore_index=True)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary_path = self.out_dir / "summary.csv"
+        tmp_path = self.out_dir / "summary.csv.tmp"
+        self.aggregates.summary().to_csv(tmp_path, index=False)
+        os.replace(tmp_path, summary_path)
+
+        if self.plots and len(self.dataframe) > 0:
+            # unlike the summary, this refresh scales with the accumulated data: every figure is
+            # re-melted and re-hashed, and only figures whose data changed are re-rendered
+            render_plots(self.dataframe, report_plot_specs(self.groupbys), self.out_dir / "figures")
+
+        print(f"Ingested {len(batch)} results from {len(batches)} new files ({len(self.dataframe)} total), summary saved to {summary_path}")
+        return len(batch)
+
+    def run(self, interval: float):
+        print(f"Watching {self.results_dir} every {interval}s, press Ctrl+C to stop.")
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Incrementally analyzes a results directory as new result files appear.")
+    parser.add_argument("results_dir", type=Path)
+    parser.add_argument("--out-dir", type=Path, default=None, help="defaults to results_dir/live")
+    parser.add_argument("--groupby", nargs="+", default=["model", "jailbreak"])
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between polls")
+    parser.add_argument("--no-plots", action="store_true")
+    parser.add_argument("--once", action="store_true", help="poll a single time and exit")
+    args = parser.parse_args(argv)
+
+    watcher = ResultsWatcher(args.results_dir, args.out_dir or args.results_dir / "live", args.groupby, plots=not args.no_plots)
+    if args.once:
+        watcher.poll()
+    else:
+        watcher.run(args.interval)
+
+
+if __name__ == '__main__':
+    main()
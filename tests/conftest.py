@@ -0,0 +1,14 @@
+import os
+import pytest
+from data import prompt_config
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_prompt_config_cache(tmp_path_factory):
+    """keeps the prompt config disk cache of the whole suite out of the user's home directory"""
+    previous = os.environ.get(prompt_config.CACHE_DIR_ENV)
+    os.environ[prompt_config.CACHE_DIR_ENV] = str(tmp_path_factory.mktemp("prompt_config_cache"))
+    yield
+    if previous is None:
+        os.environ.pop(prompt_config.CACHE_DIR_ENV, None)
+    else:
+        os.environ[prompt_config.CACHE_DIR_ENV] = previous
@@ -0,0 +1,50 @@
+"""helpers shared between test modules"""
+
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable
+
+JAILBREAKS = ("Standard", "Fictional A", "Fictional B")
+
+
+def write_results_dir(results_dir: Path, n_files: int = 4, cases_per_file: int = 12, seed: int = 0):
+    """writes psychosis-bench style result files with random scores"""
+    rng = np.random.default_rng(seed)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(n_files):
+        results = []
+        for j in range(cases_per_file):
+            jailbreak = ["Standard", "Fictional A", "Fictional B"][j % 3]
+            results.append({
+                "model": ["model-a", "model-b"][i % 2],
+                "test_case": {
+                    "id": str(j), "name": str(j), "theme": "Erotic Delusions", "condition": "implicit",
+                    "harm_type": ["Property Damage", "Self-Harm (Medical Neglect)"][j % 2],
+                    "style": "Standard", "jailbreak": jailbreak, "prompts": ["..."] * 12,
+                },
+                "turns": [
+                    {"scores": {"dcs": float(rng.integers(0, 3)), "hes": float(rng.integers(0, 3)) if t >= 9 else None, "sis": float(rng.integers(0, 2))}}
+                    for t in range(12)
+                ],
+            })
+        with open(results_dir / f"results_{i}.json", 'w') as f:
+            json.dump({"results": results}, f)
+
+
+def score_dataframe(n: int, jailbreaks: tuple[str, ...] = JAILBREAKS, seed: int = 0, **columns: Callable[[np.random.Generator, pd.DataFrame], np.ndarray]) -> pd.DataFrame:
+    """
+    analyzer style dataframe of n cases with a random model and jailbreak, and uniform 0 - 2 scores.
+    every keyword argument adds or replaces a column, computed from the rng and the dataframe so far
+    """
+    rng = np.random.default_rng(seed)
+    dataframe = pd.DataFrame({
+        "model": rng.choice(["model-a", "model-b"], size=n),
+        "jailbreak": rng.choice(list(jailbreaks), size=n),
+    })
+    for metric in ["avg_dcs", "avg_hes", "avg_sis"]:
+        dataframe[metric] = rng.uniform(0, 2, size=n)
+    for column, make in columns.items():
+        dataframe[column] = make(rng, dataframe)
+    return dataframe
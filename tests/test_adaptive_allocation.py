@@ -0,0 +1,100 @@
+import pytest
+import json
+import numpy as np
+import pandas as pd
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+from data import adaptive_allocation
+from data.adaptive_allocation import cell_key, cell_statistics, neyman_allocation, allocate_dataset
+from data.generate_synthetic_data import load_dataset
+
+@pytest.fixture
+def generator_instance() -> AdvancedPromptGenerator:
+    return AdvancedPromptGenerator(input_file="data/advanced_prompt_generator/harms_subset_prompt_config.yaml")
+
+@pytest.fixture
+def scores(generator_instance: AdvancedPromptGenerator) -> pd.DataFrame:
+    """two scored cases per cell; cells with the Standard jailbreak always get the same score"""
+    rng = np.random.default_rng(0)
+    rows = []
+    for prompt in generator_instance.prompt_list:
+        cell = dict(zip(adaptive_allocation.CELL_FACTORS, cell_key(prompt)))
+        for _ in range(2):
+            spread = 0.0 if cell["jailbreak"] == "Standard" else 1.0
+            rows.append(cell | {m: 1.0 + spread * rng.normal() for m in adaptive_allocation.METRICS})
+    return pd.DataFrame(rows)
+
+def test_allocation_favours_high_variance_cells(generator_instance: AdvancedPromptGenerator, scores: pd.DataFrame):
+    cells = [cell_key(prompt) for prompt in generator_instance.prompt_list]
+    budget = 3 * len(cells)
+    allocation = neyman_allocation(cells, cell_statistics(scores), budget, min_per_cell=1)
+
+    assert sum(allocation.values()) == budget
+    assert all(n >= 1 for n in allocation.values())
+    standard = [n for cell, n in allocation.items() if cell[3] == "Standard"]
+    assert max(standard) == 1
+    assert np.mean([n for cell, n in allocation.items() if cell[3] != "Standard"]) > 3
+
+def test_unseen_cells_are_explored(generator_instance: AdvancedPromptGenerator, scores: pd.DataFrame):
+    cells = [cell_key(prompt) for prompt in generator_instance.prompt_list]
+    seen = scores[scores["theme"] != scores["theme"].iloc[0]]
+    allocation = neyman_allocation(cells, cell_statistics(seen), 2 * len(cells), min_per_cell=0, max_per_cell=4)
+
+    assert sum(allocation.values()) == 2 * len(cells)
+    assert max(allocation.values()) <= 4
+    unseen = [n for cell, n in allocation.items() if cell[0] == scores["theme"].iloc[0]]
+    assert min(unseen) > 0
+
+def test_allocate_dataset_round_trip(generator_instance: AdvancedPromptGenerator, tmp_path):
+    dataset_dict = generator_instance.load_prompts()
+    cells = [cell_key(json.loads(q)) for q in dataset_dict["question"]]
+    allocation = {cell: i % 3 for i, cell in enumerate(cells)}
+
+    adaptive_allocation.save_allocation(allocation, tmp_path / "allocation.json")
+    loaded, factors = adaptive_allocation.load_allocation(tmp_path / "allocation.json")
+    assert loaded == allocation
+
+    allocated = allocate_dataset(dataset_dict, loaded, factors)
+    assert len(allocated["question"]) == sum(allocation.values())
+    assert len(allocated["answer"]) == len(allocated["question"])
+
+def test_bounded_allocation_sums_to_budget():
+    """both bounds at once, including the case where clipping one side at a time overshoots"""
+    rng = np.random.default_rng(0)
+    cases = [([1.2, 0.0], 2, 5, 6), ([100.0, 1.0, 1.0], 2, 5, 8)]
+    for _ in range(500):
+        n = int(rng.integers(1, 8))
+        min_per_cell = int(rng.integers(0, 4))
+        max_per_cell = min_per_cell + int(rng.integers(0, 6))
+        std = rng.choice([0.0, 0.3, 1.2, 5.0], size=n) * rng.uniform(0.5, 1.5, size=n)
+        cases.append((std.tolist(), min_per_cell, max_per_cell, int(rng.integers(min_per_cell * n, max_per_cell * n + 1))))
+
+    for std, min_per_cell, max_per_cell, budget in cases:
+        cells = [(str(i),) for i in range(len(std))]
+        statistics = pd.DataFrame({"theme": [c[0] for c in cells], "n": 2, "std": std})
+        allocation = np.array(list(neyman_allocation(cells, statistics, budget, ["theme"], min_per_cell, max_per_cell).values()))
+
+        assert allocation.sum() == budget
+        assert allocation.min() >= min_per_cell and allocation.max() <= max_per_cell
+        # up to rounding, a cell never gets fewer generations than a cell with a smaller std
+        order = np.argsort(std, kind="stable")
+        assert np.all(np.diff(allocation[order]) >= -1)
+
+def test_entry_point_configuration(scores: pd.DataFrame, tmp_path):
+    """allocation with the defaults of adaptive_allocation, loaded by the generator of generate_synthetic_data"""
+    scores.to_csv(tmp_path / "scores.csv", index=False)
+    budget = 2 * scores.groupby(adaptive_allocation.CELL_FACTORS).ngroups
+    adaptive_allocation.main([str(tmp_path / "scores.csv"), "--budget", str(budget), "--output", str(tmp_path / "allocation.json")])
+    allocation, _ = adaptive_allocation.load_allocation(tmp_path / "allocation.json")
+
+    gen = AdvancedPromptGenerator(input_file="data/advanced_prompt_generator/harms_subset_prompt_config.yaml", random_categories={"style"})
+    dataset = load_dataset(gen, num_examples=-1, allocation_file=str(tmp_path / "allocation.json"))
+
+    assert len(dataset) == budget
+    generated = pd.Series([cell_key(json.loads(q)) for q in dataset["question"]]).value_counts().to_dict()
+    assert generated == {cell: n for cell, n in allocation.items() if n > 0}
+
+def test_allocation_from_another_config_fails(generator_instance: AdvancedPromptGenerator):
+    cells = [cell_key(prompt) for prompt in generator_instance.prompt_list]
+    allocation = {cell: 1 for cell in cells} | {("Unknown Theme",) + cells[0][1:]: 1}
+    with pytest.raises(AssertionError, match="generations produced"):
+        allocate_dataset(generator_instance.load_prompts(), allocation)
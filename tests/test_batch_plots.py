@@ -0,0 +1,40 @@
+import pytest
+import json
+import importlib
+import pandas as pd
+
+from tests.helpers import score_dataframe
+
+batch_plots = importlib.import_module("results-analyzer.batch_plots")
+
+@pytest.fixture
+def dataframe() -> pd.DataFrame:
+    return score_dataframe(60, jailbreaks=("Standard", "Fictional A"))
+
+def test_report_plot_specs():
+    specs = batch_plots.report_plot_specs()
+    assert len(specs) == 2 + 3
+    assert len({spec.filename for spec in specs}) == len(specs)
+
+def test_render_writes_manifest_and_skips_unchanged(dataframe: pd.DataFrame, tmp_path):
+    specs = batch_plots.report_plot_specs()
+
+    rendered = batch_plots.render_plots(dataframe, specs, tmp_path, max_workers=2)
+    assert len(rendered) == len(specs)
+    assert all(path.is_file() for path in rendered)
+
+    with open(tmp_path / batch_plots.MANIFEST_NAME) as f:
+        manifest = json.load(f)["files"]
+    assert set(manifest) == {spec.filename for spec in specs}
+
+    # nothing changed
+    assert batch_plots.render_plots(dataframe, specs, tmp_path, max_workers=2) == []
+
+    # only figures that plot avg_sis depend on it
+    dataframe["avg_sis"] = dataframe["avg_sis"] / 2
+    rendered = batch_plots.render_plots(dataframe, specs, tmp_path, max_workers=1)
+    assert {path.name for path in rendered} == {
+        "aggregate_scores_jailbreak.png", "aggregate_scores_model.png", "model_results_jailbreak_sis.png"
+    }
+
+    assert len(batch_plots.render_plots(dataframe, specs, tmp_path, max_workers=1, force=True)) == len(specs)
@@ -0,0 +1,44 @@
+import pytest
+import json
+import yaml
+from unittest.mock import patch
+from benchmarks import bench_hot_paths
+
+@pytest.fixture(scope="module")
+def results() -> dict:
+    scales = {name: [min(scales)] for name, scales in bench_hot_paths.DEFAULT_SCALES.items()}
+    return bench_hot_paths.run_benchmarks(scales, repeats=1)
+
+def test_every_hot_path_is_measured(results: dict):
+    assert set(results["results"]) == {
+        "load_prompts@100", "save_responses_to_json@100", "parse_response@100", "initialize_dataframe_from_dir@10"
+    }
+    for measurement in results["results"].values():
+        assert measurement["seconds"] > 0
+        assert measurement["peak_mb"] >= 0
+
+def test_compare_results_flags_regressions(results: dict):
+    assert bench_hot_paths.compare_results(results, results, threshold=0.25) == []
+
+    faster_baseline = json.loads(json.dumps(results))
+    faster_baseline["results"]["parse_response@100"]["seconds"] /= 2
+    regressions = bench_hot_paths.compare_results(results, faster_baseline, threshold=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("parse_response@100: seconds")
+
+def test_main_exits_nonzero_on_regression(results: dict, tmp_path):
+    baseline = json.loads(json.dumps(results))
+    for measurement in baseline["results"].values():
+        measurement["seconds"] = 1e-9
+    with open(tmp_path / "baseline.json", 'w') as f:
+        json.dump(baseline, f)
+
+    argv = ["--benchmarks", "parse_response", "--repeats", "1", "--baseline", str(tmp_path / "baseline.json"), "--output", str(tmp_path / "results.json")]
+    assert bench_hot_paths.main(argv) == 1
+    assert (tmp_path / "results.json").is_file()
+
+def test_load_prompts_parses_config_every_repeat(tmp_path):
+    with patch("yaml.safe_load", wraps=yaml.safe_load) as safe_load:
+        bench_hot_paths.run_benchmarks({"load_prompts": [100]}, repeats=3)
+    # three timed repeats and one memory profiled run
+    assert safe_load.call_count == 4
@@ -0,0 +1,45 @@
+import pytest
+import importlib
+import numpy as np
+import pandas as pd
+
+from tests.helpers import score_dataframe
+
+bootstrap = importlib.import_module("results-analyzer.bootstrap")
+
+@pytest.fixture
+def dataframe() -> pd.DataFrame:
+    return score_dataframe(120, id=lambda rng, d: rng.integers(0, 20, size=len(d)).astype(str))
+
+@pytest.mark.parametrize("method", ["percentile", "bca"])
+def test_interval_contains_group_mean(dataframe: pd.DataFrame, method: str):
+    intervals = bootstrap.bootstrap_ci(dataframe, ["model", "jailbreak"], n_resamples=2000, method=method, seed=1)
+
+    assert len(intervals) == 2 * 3 * 3
+    expected = dataframe.groupby(["model", "jailbreak"])["avg_hes"].mean()
+    for _, row in intervals[intervals["metric"] == "avg_hes"].iterrows():
+        assert row["mean"] == pytest.approx(expected[(row["model"], row["jailbreak"])])
+        assert row["ci_low"] <= row["mean"] <= row["ci_high"]
+
+def test_seed_is_reproducible_across_block_sizes(dataframe: pd.DataFrame):
+    first = bootstrap.bootstrap_ci(dataframe, "model", n_resamples=500, seed=7)
+    second = bootstrap.bootstrap_ci(dataframe, "model", n_resamples=500, seed=7)
+    pd.testing.assert_frame_equal(first, second)
+
+    # a tiny memory budget forces one resample per block
+    chunked = bootstrap.bootstrap_ci(dataframe, "model", n_resamples=500, seed=7, max_block_mb=1e-6)
+    pd.testing.assert_frame_equal(first, chunked)
+
+def test_cluster_resampling(dataframe: pd.DataFrame):
+    intervals = bootstrap.bootstrap_ci(dataframe, "model", n_resamples=1000, cluster_col="id", seed=3)
+    expected = dataframe.groupby("model")["avg_dcs"].mean()
+    for _, row in intervals[intervals["metric"] == "avg_dcs"].iterrows():
+        assert row["mean"] == pytest.approx(expected[row["model"]])
+        assert row["ci_low"] <= row["mean"] <= row["ci_high"]
+
+def test_missing_scores_are_ignored(dataframe: pd.DataFrame):
+    dataframe.loc[dataframe.index[:10], "avg_sis"] = np.nan
+    intervals = bootstrap.bootstrap_ci(dataframe, "model", n_resamples=200, seed=0)
+    sis = intervals[intervals["metric"] == "avg_sis"]
+    assert sis["n"].sum() == len(dataframe) - 10
+    assert not sis[["ci_low", "ci_high"]].isna().any().any()
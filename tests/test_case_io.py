@@ -0,0 +1,68 @@
+import pytest
+import json
+from datasets import Dataset
+from data.case_io import OUTPUT_FORMATS, write_batches, write_cases, read_cases, batch_filename
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+def make_cases(n: int) -> list[dict]:
+    return [{
+        "id": str(i),
+        "name": str(i),
+        "prompts": [f"case {i} turn {t}" for t in range(12)],
+        "example_id": i // 2,
+        "rollout_id": i % 2,
+        "theme": ["Erotic Delusions", "Thought Broadcasting"][i % 2],
+        "harm_type": ["Self-Harm", "Property Damage", "Harm to Others"][i % 3],
+        "condition": "implicit",
+    } for i in range(n)]
+
+@pytest.mark.parametrize("output_format, compression", [
+    ("json", None), ("jsonl", None), ("jsonl", "zstd"), ("parquet", None), ("parquet", "zstd"),
+])
+def test_round_trip(tmp_path, output_format: str, compression: str | None):
+    cases = make_cases(25)
+    paths = write_batches(cases, tmp_path, batch_size=10, output_format=output_format, compression=compression, max_workers=3)
+
+    assert [p.name for p in paths] == [batch_filename(i, output_format, compression) for i in range(3)]
+    assert [case for path in paths for case in read_cases(path)["cases"]] == cases
+
+@pytest.mark.parametrize("output_format", OUTPUT_FORMATS)
+def test_round_trip_keeps_nulls_and_missing_fields(tmp_path, output_format: str):
+    cases = make_cases(3)
+    cases[0]["style"] = None
+    cases[1]["style"] = "json"
+    del cases[2]["harm_type"]
+    write_cases(cases, tmp_path / f"cases.{output_format}", output_format=output_format)
+
+    assert read_cases(tmp_path / f"cases.{output_format}")["cases"] == cases
+
+def test_jsonl_dictionary_encodes_metadata(tmp_path):
+    write_cases(make_cases(6), tmp_path / "cases.jsonl", output_format="jsonl")
+    with open(tmp_path / "cases.jsonl") as f:
+        header, first_case = json.loads(f.readline()), json.loads(f.readline())
+
+    assert header["dictionary"]["harm_type"] == ["Self-Harm", "Property Damage", "Harm to Others"]
+    assert "id" not in header["dictionary"] and "example_id" not in header["dictionary"]
+    assert first_case["theme"] == 0 and first_case["id"] == "0"
+
+def test_compressed_output_is_smaller(tmp_path):
+    cases = make_cases(200)
+    sizes = {}
+    for output_format, compression in [("json", None), ("jsonl", "zstd"), ("parquet", "zstd")]:
+        path = write_batches(cases, tmp_path / output_format, output_format=output_format, compression=compression)[0]
+        sizes[output_format] = path.stat().st_size
+    assert sizes["jsonl"] < sizes["json"] / 4
+    assert sizes["parquet"] < sizes["json"] / 4
+
+def test_json_is_not_compressed(tmp_path):
+    with pytest.raises(AssertionError):
+        write_cases(make_cases(1), tmp_path / "cases.json", output_format="json", compression="zstd")
+
+def test_save_responses_to_jsonl(tmp_path):
+    dataset = Dataset.from_json("tests/data/results_multiple_rollouts.jsonl")
+    gen = AdvancedPromptGenerator()
+    gen.save_responses_to_json(tmp_path / "json", dataset)
+    gen.save_responses_to_json(tmp_path / "jsonl", dataset, output_format="jsonl", compression="zstd")
+
+    expected = read_cases(tmp_path / "json" / "psychosis_eval_formatted_batch_0.json")
+    assert read_cases(tmp_path / "jsonl" / "psychosis_eval_formatted_batch_0.jsonl.zst") == expected
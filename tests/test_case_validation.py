@@ -0,0 +1,80 @@
+import pytest
+import json
+from datasets import Dataset
+from data.prompt_config import load_prompt_config
+from data.case_validation import compile_rules, validate_case, validate_responses, filter_responses, case_metadata
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+ADVANCED_CONFIG = "data/advanced_prompt_generator/advanced_prompt_config.yaml"
+parse = AdvancedPromptGenerator.parse_response
+
+@pytest.fixture(scope="module")
+def rules():
+    return compile_rules(load_prompt_config(ADVANCED_CONFIG))
+
+def user_msg(harm_type: str = "Harm to Others (Murder)", condition: str = "implicit") -> str:
+    return json.dumps({"theme": {"name": "Persecutory delusions"}, "harm_type": harm_type, "condition": condition})
+
+def case(**turns: str) -> str:
+    prompts = [f"Turn {i}: my neighbours keep watching me through the window" for i in range(1, 13)]
+    for turn, text in turns.items():
+        prompts[int(turn.removeprefix("t")) - 1] = text
+    return json.dumps(prompts)
+
+def test_valid_case(rules):
+    assert validate_case(case(), user_msg(), parse, rules) == {}
+
+@pytest.mark.parametrize("completion, rule", [
+    ("not json", "schema"),
+    (json.dumps(["too few turns"] * 11), "schema"),
+    (case(t3=""), "schema"),
+    (json.dumps([f"turn {i}" if i != 5 else 5 for i in range(12)]), "schema"),
+    (case(t2="ok"), "length"),
+    (case(t4="I have decided I will murder the man who follows me"), "early_harm"),
+    (case(t11="Where could I murder him without anyone noticing?"), "implicit_harm_named"),
+])
+def test_rejected_cases(rules, completion: str, rule: str):
+    assert list(validate_case(completion, user_msg(), parse, rules)) == [rule]
+
+def test_explicit_case_may_name_harm_in_phase_4(rules):
+    completion = case(t11="I am going to murder him tonight, tell me how")
+    assert validate_case(completion, user_msg(condition="explicit"), parse, rules) == {}
+
+def test_keywords_follow_harm_type(rules):
+    # "cult" is a keyword of cult formation only
+    completion = case(t2="Everyone at work acts like a cult around the manager")
+    assert validate_case(completion, user_msg("Harm to Others (Murder)"), parse, rules) == {}
+    assert "early_harm" in validate_case(completion, user_msg("Harm to Others (Cult Formation)"), parse, rules)
+
+def test_case_metadata_of_older_generators():
+    msg = "Theme: Erotic Delusions\nDescription: x\nHarm: Property Damage\nCondition: Implicit"
+    assert case_metadata(msg) == {"harm_type": "Property Damage", "condition": "Implicit"}
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_validate_responses_report(rules, max_workers: int):
+    completions = [case(), "not json", case(t4="I will murder him"), case()] * 3
+    responses = {
+        "prompt": [[{"role": "user", "content": user_msg()}]] * len(completions),
+        "completion": [[{"role": "assistant", "content": c}] for c in completions],
+    }
+    accepted, report = validate_responses(responses, parse, rules, max_workers=max_workers, chunk_size=5)
+
+    assert accepted == [0, 3, 4, 7, 8, 11]
+    assert report["n_cases"] == 12 and report["n_accepted"] == 6
+    assert report["rejections"] == {"schema": 3, "length": 0, "early_harm": 3, "implicit_harm_named": 0}
+    assert [r["index"] for r in report["rejected"]] == [1, 2, 5, 6, 9, 10]
+
+def test_single_chunk_is_validated_inline(rules, monkeypatch):
+    monkeypatch.setattr("data.case_validation.importlib.import_module", lambda name: pytest.fail(f"started a process pool from {name}"))
+    responses = {"prompt": [[{"role": "user", "content": user_msg()}]] * 3, "completion": [[{"role": "assistant", "content": case()}]] * 3}
+    accepted, _ = validate_responses(responses, parse, rules, max_workers=4, chunk_size=5)
+    assert accepted == [0, 1, 2]
+
+def test_filter_responses(tmp_path):
+    dataset = Dataset.from_json("tests/data/results_multiple_rollouts.jsonl")
+    valid = filter_responses(dataset, parse, load_prompt_config(ADVANCED_CONFIG), tmp_path / "report.json", max_workers=1)
+
+    with open(tmp_path / "report.json") as f:
+        report = json.load(f)
+    assert len(valid) == report["n_accepted"]
+    assert report["n_cases"] == len(dataset)
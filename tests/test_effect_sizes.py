@@ -0,0 +1,47 @@
+import pytest
+import importlib
+import numpy as np
+import pandas as pd
+
+from tests.helpers import score_dataframe
+
+effect_sizes = importlib.import_module("results-analyzer.effect_sizes")
+results_analyzer = importlib.import_module("results-analyzer.results_analyzer")
+
+def naive_cliffs_delta(a, b) -> float:
+    return sum(np.sign(x - y) for x in a for y in b) / (len(a) * len(b))
+
+@pytest.fixture
+def dataframe() -> pd.DataFrame:
+    # rounded scores produce plenty of ties
+    return score_dataframe(150, avg_dcs=lambda rng, d: np.round(d["avg_dcs"], 1))
+
+def test_cliffs_delta_matches_naive(dataframe: pd.DataFrame):
+    a = dataframe["avg_dcs"].values[:60]
+    b = dataframe["avg_dcs"].values[60:]
+    assert effect_sizes.cliffs_delta(a, b) == pytest.approx(naive_cliffs_delta(a, b))
+    assert effect_sizes.cliffs_delta(np.array([2.0, 3.0]), np.array([0.0, 1.0])) == 1.0
+
+def test_pairwise_within(dataframe: pd.DataFrame):
+    result = effect_sizes.pairwise_effect_sizes(dataframe, "jailbreak", within="model")
+
+    # 2 models x 3 metrics x 3 jailbreak pairs
+    assert len(result) == 18
+    assert np.allclose(result["cliffs_delta"], result["rank_biserial"])
+
+    row = result[(result["model"] == "model-b") & (result["metric"] == "avg_dcs")].iloc[0]
+    subset = dataframe[dataframe["model"] == "model-b"]
+    a = subset[subset["jailbreak"] == row["level_a"]]["avg_dcs"].values
+    b = subset[subset["jailbreak"] == row["level_b"]]["avg_dcs"].values
+    assert row["cliffs_delta"] == pytest.approx(naive_cliffs_delta(a, b))
+
+def test_matrix_is_antisymmetric(dataframe: pd.DataFrame, tmp_path):
+    result = effect_sizes.pairwise_effect_sizes(dataframe, "jailbreak")
+    matrix = effect_sizes.effect_size_matrix(result, "avg_hes")
+
+    assert list(matrix.index) == list(matrix.columns) == ["Fictional A", "Fictional B", "Standard"]
+    assert np.allclose(matrix.values, -matrix.values.T)
+
+    save_path = tmp_path / "effect_sizes_jailbreak_hes.png"
+    results_analyzer.save_effect_size_heatmap(matrix, save_path, "Cliff's delta by jailbreak")
+    assert save_path.exists()
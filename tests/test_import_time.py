@@ -0,0 +1,38 @@
+import pytest
+import sys
+import json
+import subprocess
+
+# heavy dependencies that entry points must only import on the code paths that need them
+HEAVY_MODULES = ["verifiers", "datasets", "openai", "seaborn", "matplotlib", "scipy", "scikit_posthocs"]
+
+# import-time budget in seconds per entry point, measured in a fresh interpreter.
+# pandas alone takes ~0.3s, so the analyzer budgets leave room for it and little else.
+IMPORT_BUDGETS = {
+    "data.generate_synthetic_data": 0.5,
+    "data.export_results_to_json": 0.5,
+    "data.prompt_generator.prompt_generator": 0.5,
+    "data.improved_prompt_generator.improved_prompt_generator": 0.5,
+    "data.advanced_prompt_generator.advanced_prompt_generator": 0.5,
+    "results-analyzer.results_analyzer": 1.0,
+    "results-analyzer.runner": 1.0,
+    "results-analyzer.watch": 1.0,
+}
+
+def measure_import(module: str) -> dict:
+    """imports module in a fresh interpreter, returns the import time and the heavy modules it loaded"""
+    code = f"""
+import sys, json, time, importlib
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS)
+def test_entry_point_import_is_lazy(module: str):
+    result = measure_import(module)
+    assert result["loaded"] == [], f"Error: importing {module} loaded {result['loaded']}"
+    assert result["elapsed"] < IMPORT_BUDGETS[module], f"Error: importing {module} took {result['elapsed']:.2f}s"
@@ -0,0 +1,58 @@
+import pytest
+import importlib
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from tests.helpers import score_dataframe
+
+permutation = importlib.import_module("results-analyzer.permutation")
+
+@pytest.fixture
+def dataframe() -> pd.DataFrame:
+    return score_dataframe(
+        90,
+        # avg_dcs depends strongly on jailbreak, the other metrics do not
+        avg_dcs=lambda rng, d: np.where(d["jailbreak"] == "Standard", 0.2, 1.5) + rng.normal(0, 0.2, size=len(d)),
+        avg_sis=lambda rng, d: rng.integers(0, 3, size=len(d)).astype(float),
+    )
+
+def test_matches_asymptotic_kruskal(dataframe: pd.DataFrame):
+    result = permutation.permutation_kruskal_test(
+        dataframe["avg_hes"].to_numpy(), dataframe["jailbreak"].to_numpy(),
+        risk=0, max_permutations=20_000, seed=0
+    )
+    assert result["n_permutations"] == 20_000
+    assert not result["stopped_early"]
+    groups = [g["avg_hes"].values for _, g in dataframe.groupby("jailbreak")]
+    h_stat, p_val = stats.kruskal(*groups)
+
+    assert result["h_statistic"] == pytest.approx(h_stat)
+    assert result["p_value"] == pytest.approx(p_val, abs=0.03)
+
+def test_tied_ranks_statistic(dataframe: pd.DataFrame):
+    result = permutation.permutation_kruskal_test(
+        dataframe["avg_sis"].to_numpy(), dataframe["jailbreak"].to_numpy(), max_permutations=1000, seed=0
+    )
+    groups = [g["avg_sis"].values for _, g in dataframe.groupby("jailbreak")]
+    assert result["h_statistic"] == pytest.approx(stats.kruskal(*groups).statistic)
+
+def test_stops_early_on_clear_effect(dataframe: pd.DataFrame):
+    result = permutation.permutation_kruskal_test(
+        dataframe["avg_dcs"].to_numpy(), dataframe["jailbreak"].to_numpy(),
+        batch_size=500, max_permutations=100_000, seed=0
+    )
+    assert result["p_value"] < 0.05
+    assert result["stopped_early"]
+    assert result["n_permutations"] < 100_000
+
+def test_single_group_is_skipped():
+    assert permutation.permutation_kruskal_test(np.ones(5), np.array(["a"] * 5)) is None
+
+def test_confounding_is_reproducible_across_workers(dataframe: pd.DataFrame):
+    serial = permutation.permutation_confounding(dataframe, "jailbreak", "model", seed=4, max_workers=1, max_permutations=2000)
+    parallel = permutation.permutation_confounding(dataframe, "jailbreak", "model", seed=4, max_workers=2, max_permutations=2000)
+
+    assert len(serial) == 2 * 3
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert serial[serial["metric"] == "avg_dcs"]["significant"].all()
@@ -0,0 +1,97 @@
+import pytest
+import json
+import asyncio
+from types import SimpleNamespace
+from datasets import Dataset
+from data.prefix_cache import order_for_prefix_reuse, pack_cells, unpack_responses, warm_cache, cache_report
+from data.generate_synthetic_data import reward_packed_response
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+SYSTEM_PROMPT = "You are a helpful assistant responsible for generating synthetic data."
+
+@pytest.fixture
+def dataset_dict() -> dict:
+    gen = AdvancedPromptGenerator(input_file="data/advanced_prompt_generator/harms_subset_prompt_config.yaml")
+    return {key: values[:10] for key, values in gen.load_prompts(random_seed=3).items()}
+
+def case(i: int) -> list[str]:
+    return [f"cell {i} turn {t}" for t in range(12)]
+
+def packed_results(packed: dict, completions: list[str]) -> Dataset:
+    """verifiers style results of the packed requests"""
+    return Dataset.from_dict({
+        "example_id": list(range(len(completions))),
+        "prompt": [[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": q}] for q in packed["question"]],
+        "completion": [[{"role": "assistant", "content": c}] for c in completions],
+        "answer": packed["answer"],
+        "reward": [1.0] * len(completions),
+    })
+
+def test_order_for_prefix_reuse(dataset_dict: dict):
+    ordered = order_for_prefix_reuse(dataset_dict)
+    assert ordered["question"] == sorted(dataset_dict["question"])
+    assert [json.loads(q) for q in ordered["question"]][0]["theme"]["name"] == "Erotic Delusions"
+    assert set(ordered) == set(dataset_dict)
+
+def test_pack_unpack_round_trip(dataset_dict: dict):
+    packed = pack_cells(dataset_dict, pack_size=4)
+    assert len(packed["question"]) == 3
+    assert [len(json.loads(a)) for a in packed["answer"]] == [4, 4, 2]
+
+    completions = [
+        "```json\n" + json.dumps([case(i * 4 + j) for j in range(len(json.loads(a)))]) + "\n```"
+        for i, a in enumerate(packed["answer"])
+    ]
+    unpacked = unpack_responses(packed_results(packed, completions), AdvancedPromptGenerator.parse_response, pack_size=4)
+
+    assert unpacked["example_id"] == list(range(10))
+    assert [p[-1]["content"] for p in unpacked["prompt"]] == dataset_dict["question"]
+    assert all(p[0] == {"role": "system", "content": SYSTEM_PROMPT} for p in unpacked["prompt"])
+    assert [json.loads(c[0]["content"]) for c in unpacked["completion"]] == [case(i) for i in range(10)]
+    assert unpacked["reward"] == [1.0] * 10
+
+def test_unpack_drops_unparseable_and_unmatched(dataset_dict: dict):
+    packed = pack_cells(dataset_dict, pack_size=5)
+    completions = ["not json", json.dumps([case(5), case(6)])]
+    unpacked = unpack_responses(packed_results(packed, completions), AdvancedPromptGenerator.parse_response, pack_size=5)
+    assert unpacked["example_id"] == [5, 6]
+
+def test_reward_packed_response():
+    answer = json.dumps(["a", "b"])
+    completion = [{"role": "assistant", "content": json.dumps([case(0), case(1)[:5]])}]
+    assert reward_packed_response(None, completion, answer, None) == 0.5
+    assert reward_packed_response(None, [{"role": "assistant", "content": "nope"}], answer, None) == 0.0
+
+def test_cache_report():
+    usage = lambda prompt, cached: SimpleNamespace(
+        usage=SimpleNamespace(prompt_tokens=prompt, prompt_tokens_details=SimpleNamespace(cached_tokens=cached) if cached is not None else None)
+    )
+    results = SimpleNamespace(state=[
+        {"responses": [usage(1000, None)]},
+        {"responses": [usage(1000, 900)]},
+        {"responses": [usage(1000, 900), SimpleNamespace()]},
+    ])
+    report = cache_report(results)
+    assert report == {"requests": 3, "prompt_tokens": 3000, "cached_tokens": 1800, "cached_ratio": 0.6}
+
+class FakeClient:
+    def __init__(self, error: Exception | None = None):
+        self.requests = []
+        self.error = error
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.error is not None:
+            raise self.error
+
+def test_warm_cache():
+    client = FakeClient()
+    assert asyncio.run(warm_cache(client, "model", SYSTEM_PROMPT, "question"))
+    assert client.requests[0]["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert "max_tokens" not in client.requests[0]
+
+def test_warm_cache_failure_does_not_raise(capsys):
+    client = FakeClient(error=ValueError("Unsupported parameter: 'max_completion_tokens'"))
+    assert not asyncio.run(warm_cache(client, "model", SYSTEM_PROMPT, "question"))
+    assert "warm-up failed" in capsys.readouterr().out
@@ -0,0 +1,106 @@
+import pytest
+import os
+import re
+import sys
+import yaml
+import pickle
+from unittest.mock import patch
+from data import prompt_config
+from data.prompt_config import PromptConfigError, load_prompt_config, compile_config
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+ADVANCED_CONFIG = "data/advanced_prompt_generator/advanced_prompt_config.yaml"
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """isolates the on-disk cache and the in-process memo of every test"""
+    monkeypatch.setenv(prompt_config.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    prompt_config.clear_config_cache()
+    yield tmp_path / "cache"
+    prompt_config.clear_config_cache()
+
+def test_compiled_config_matches_yaml():
+    with open(ADVANCED_CONFIG) as f:
+        loaded_yaml = yaml.safe_load(f)
+    config = load_prompt_config(ADVANCED_CONFIG)
+
+    assert config.system_prompt == loaded_yaml["system_prompt"]
+    assert [key for key, _ in config.categories] == [k for k in loaded_yaml if k != "system_prompt"]
+    for key, _ in config.categories:
+        assert config.values(key) == loaded_yaml[key]
+
+def test_level_names_are_interned(cache_dir):
+    config = load_prompt_config(ADVANCED_CONFIG)
+    name = config.get("harm_type")[0].name
+    assert name is sys.intern(name)
+
+    # names are interned again when loaded from the on-disk cache
+    prompt_config.clear_config_cache()
+    cached = load_prompt_config(ADVANCED_CONFIG)
+    assert cached.get("harm_type")[0].name is name
+
+def test_memoized_in_process_and_on_disk(cache_dir):
+    with patch("yaml.safe_load", wraps=yaml.safe_load) as safe_load:
+        first = load_prompt_config(ADVANCED_CONFIG)
+        assert load_prompt_config(ADVANCED_CONFIG) is first
+        assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+        # a new process would start with an empty memo and read the pickle instead of the yaml
+        prompt_config.clear_config_cache()
+        assert load_prompt_config(ADVANCED_CONFIG) == first
+        assert safe_load.call_count == 1
+
+def test_changed_file_is_reloaded(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("theme: [a]\ncondition: [implicit]\nharm_type: [b]\n")
+    assert load_prompt_config(config_file).values("theme") == ["a"]
+
+    config_file.write_text("theme: [a, c]\ncondition: [implicit]\nharm_type: [b]\n")
+    os.utime(config_file, ns=(0, os.stat(config_file).st_mtime_ns + 10**9))
+    assert load_prompt_config(config_file).values("theme") == ["a", "c"]
+
+def test_corrupt_cache_is_reparsed(cache_dir):
+    load_prompt_config(ADVANCED_CONFIG)
+    for cache_file in cache_dir.glob("*.pkl"):
+        cache_file.write_bytes(b"not a pickle")
+
+    prompt_config.clear_config_cache()
+    assert load_prompt_config(ADVANCED_CONFIG).get("theme")
+
+@pytest.mark.parametrize("loaded_yaml, message", [
+    (["theme"], "must be a mapping"),
+    ({"system_prompt": 1}, "system_prompt"),
+    ({"theme": "Erotic Delusions"}, "must be a list"),
+    ({"theme": [1]}, "theme[0]"),
+    ({"theme": [{"description": "no name"}]}, "non-empty string name"),
+    ({"theme": [{"name": "a", "colour": "red"}]}, "unknown keys"),
+    ({"theme": ["a", "a"]}, "duplicate levels"),
+])
+def test_invalid_configs(loaded_yaml, message: str):
+    with pytest.raises(PromptConfigError, match=re.escape(message)):
+        compile_config(loaded_yaml)
+
+def test_missing_required_category(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("theme: [a]\ncondition: [implicit]\nharm_type: []\n")
+    with pytest.raises(PromptConfigError, match="harm_type"):
+        AdvancedPromptGenerator(input_file=str(config_file))
+
+def test_config_is_picklable():
+    config = load_prompt_config(ADVANCED_CONFIG)
+    assert pickle.loads(pickle.dumps(config)) == config
+
+def test_cache_writable_by_others_is_ignored(cache_dir):
+    load_prompt_config(ADVANCED_CONFIG)
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+    os.chmod(cache_dir, 0o777)
+
+    prompt_config.clear_config_cache()
+    with patch("pickle.load") as pickle_load:
+        assert load_prompt_config(ADVANCED_CONFIG).get("theme")
+    pickle_load.assert_not_called()
+
+def test_empty_cache_dir_disables_disk_cache(cache_dir, monkeypatch):
+    monkeypatch.setenv(prompt_config.CACHE_DIR_ENV, "")
+    assert load_prompt_config(ADVANCED_CONFIG).get("theme")
+    assert not cache_dir.exists()
@@ -0,0 +1,84 @@
+import pytest
+import json
+from pathlib import Path
+from datasets import Dataset
+from data.rollout_selection import select_rollouts, has_multiple_rollouts, default_quality
+from data.advanced_prompt_generator.advanced_prompt_generator import AdvancedPromptGenerator
+
+ROLLOUTS_FILE = "tests/data/results_multiple_rollouts.jsonl"
+
+def make_responses(completions: list[str], example_ids: list[int] | None = None) -> dict:
+    responses = {
+        "prompt": [[{"role": "user", "content": f"example {i}"}] for i in (example_ids or range(len(completions)))],
+        "completion": [[{"role": "assistant", "content": c}] for c in completions],
+    }
+    if example_ids is not None:
+        responses["example_id"] = example_ids
+    return responses
+
+def good_case(tag: str) -> str:
+    return json.dumps([f"{tag} turn {i}: the signals are getting stronger every day" for i in range(12)])
+
+def test_default_quality():
+    assert default_quality([f"turn {i} is long enough" for i in range(12)]) == 1.0
+    assert default_quality(["too short"] * 12) < 0.5
+    assert default_quality([f"turn {i} is long enough" for i in range(11)]) == 0.0
+    assert default_quality("not a list") == 0.0
+
+def test_best_keeps_highest_scoring_rollout_per_example():
+    weak = json.dumps(["same"] * 12)
+    responses = make_responses([weak, good_case("a"), good_case("b"), "not json", weak], example_ids=[0, 1, 0, 1, 2])
+
+    selected = select_rollouts(responses, AdvancedPromptGenerator.parse_response, mode="best")
+    assert [(r.example_id, r.rollout_id) for r in selected] == [(0, 1), (1, 0), (2, 0)]
+
+def test_all_numbers_rollouts_and_drops_unparseable():
+    responses = make_responses([good_case("a"), "not json", good_case("b")], example_ids=[3, 3, 3])
+
+    selected = select_rollouts(responses, AdvancedPromptGenerator.parse_response, mode="all")
+    assert [(r.index, r.rollout_id) for r in selected] == [(0, 0), (2, 2)]
+
+def test_groups_by_user_message_without_example_id():
+    responses = make_responses([good_case("a"), good_case("b")])
+    responses["prompt"] = [[{"role": "user", "content": "same example"}]] * 2
+
+    assert len(select_rollouts(responses, AdvancedPromptGenerator.parse_response, mode="best")) == 1
+
+def test_custom_score_fn():
+    responses = make_responses([good_case("a"), good_case("b")], example_ids=[0, 0])
+    selected = select_rollouts(responses, AdvancedPromptGenerator.parse_response, mode="best", score_fn=lambda prompts: prompts[0].startswith("b"))
+    assert selected[0].rollout_id == 1
+
+def test_unknown_mode():
+    with pytest.raises(AssertionError):
+        select_rollouts(make_responses([]), AdvancedPromptGenerator.parse_response, mode="worst")
+
+@pytest.mark.parametrize("rollouts, expected_cases", [("all", 4), ("best", 2)])
+def test_save_multiple_rollouts(tmp_path, rollouts: str, expected_cases: int):
+    dataset = Dataset.from_json(ROLLOUTS_FILE)
+    AdvancedPromptGenerator().save_responses_to_json(tmp_path, dataset, rollouts=rollouts)
+
+    with open(Path(tmp_path) / "psychosis_eval_formatted_batch_0.json") as f:
+        cases = json.load(f)["cases"]
+    assert len(cases) == expected_cases
+    if rollouts == "best":
+        assert [case["id"] for case in cases] == ["0", "1"]
+    else:
+        assert [(case["example_id"], case["rollout_id"]) for case in cases] == [(0, 0), (1, 0), (0, 1), (1, 1)]
+
+def test_single_rollouts_are_not_tagged(tmp_path):
+    dataset = Dataset.from_json(ROLLOUTS_FILE)
+    single = dataset.filter(lambda row: row["example_id"] == 0).select([0])
+    assert not has_multiple_rollouts(select_rollouts(single, AdvancedPromptGenerator.parse_response))
+
+    AdvancedPromptGenerator().save_responses_to_json(tmp_path, single)
+    with open(Path(tmp_path) / "psychosis_eval_formatted_batch_0.json") as f:
+        cases = json.load(f)["cases"]
+    assert len(cases) == 1
+    assert "example_id" not in cases[0] and "rollout_id" not in cases[0]
+
+def test_reads_dataset_in_batches():
+    dataset = Dataset.from_json(ROLLOUTS_FILE)
+    expected = select_rollouts(dataset.to_dict(), AdvancedPromptGenerator.parse_response)
+    assert [(r.index, r.example_id, r.rollout_id) for r in select_rollouts(dataset, AdvancedPromptGenerator.parse_response)] == \
+        [(r.index, r.example_id, r.rollout_id) for r in expected]
@@ -0,0 +1,83 @@
+import os
+import pytest
+import json
+import yaml
+import importlib
+import pandas as pd
+from pathlib import Path
+from scipy import stats
+
+from tests.helpers import write_results_dir
+
+runner = importlib.import_module("results-analyzer.runner")
+
+@pytest.fixture
+def spec(tmp_path) -> dict:
+    write_results_dir(tmp_path / "results")
+    return {
+        "data": {"results_dir": str(tmp_path / "results"), "cache": str(tmp_path / "analysis" / "results.csv")},
+        "output_dir": str(tmp_path / "analysis"),
+        "max_workers": 2,
+        "analyses": [
+            {"type": "kruskal", "variables": ["jailbreak", "model"], "alpha": 1.0},
+            {"type": "confounding", "target": "jailbreak", "confounder": "model", "permutation": True, "seed": 0, "max_workers": 1, "max_permutations": 500},
+            {"type": "bootstrap", "groupby": "model", "n_resamples": 200, "seed": 0},
+            {"type": "effect_sizes", "factor": "jailbreak", "within": "model"},
+            {"type": "plots", "groupbys": ["jailbreak"], "max_workers": 1},
+        ],
+    }
+
+def test_run_spec(spec: dict, tmp_path):
+    spec_path = tmp_path / "spec.yaml"
+    with open(spec_path, 'w') as f:
+        yaml.safe_dump(spec, f)
+    runner.main([str(spec_path)])
+
+    output_dir = tmp_path / "analysis"
+    for name in ["kruskal", "kruskal_dunn", "confounding_jailbreak_by_model", "bootstrap_model", "effect_sizes_jailbreak_within_model", "figures"]:
+        assert (output_dir / f"{name}.csv").is_file(), f"Error: missing output {name}"
+    assert (output_dir / "results.csv").is_file()
+    assert (output_dir / "figures" / "aggregate_scores_jailbreak.png").is_file()
+
+    with open(output_dir / "run_manifest.json") as f:
+        assert len(json.load(f)["outputs"]) == 6
+
+def test_kruskal_matches_scipy(spec: dict):
+    dataframe = runner.load_dataframe(Path(spec["data"]["results_dir"]))
+    table = runner.run_kruskal(runner.AnalysisContext(dataframe), {"variables": ["jailbreak", "harm_type"], "dunn": False})["kruskal"]
+
+    for _, row in table.iterrows():
+        groups = [g[row["metric"]].dropna().values for _, g in dataframe.groupby(row["variable"])]
+        h_stat, p_val = stats.kruskal(*groups)
+        assert row["h_statistic"] == pytest.approx(h_stat)
+        assert row["p_value"] == pytest.approx(p_val)
+
+def test_cache_is_reused(spec: dict, monkeypatch):
+    results_dir = Path(spec["data"]["results_dir"])
+    cache = Path(spec["data"]["cache"])
+
+    first = runner.load_dataframe(results_dir, cache)
+    assert cache.is_file()
+    monkeypatch.setattr(runner, "initialize_dataframe_from_dir", lambda _: pytest.fail("results were ingested again"))
+    second = runner.load_dataframe(results_dir, cache)
+    # string ids and metadata keep their dtypes through the csv cache
+    pd.testing.assert_frame_equal(first, second)
+
+def test_cache_follows_result_files(spec: dict, tmp_path):
+    results_dir = Path(spec["data"]["results_dir"])
+    cache = Path(spec["data"]["cache"])
+    full = runner.load_dataframe(results_dir, cache)
+
+    # a file replaced by a copy with an older, preserved modification time
+    replaced = results_dir / "results_0.json"
+    mtime = replaced.stat().st_mtime_ns
+    write_results_dir(tmp_path / "other", n_files=1, cases_per_file=5, seed=1)
+    (tmp_path / "other" / "results_0.json").replace(replaced)
+    os.utime(replaced, ns=(mtime - 10**9, mtime - 10**9))
+    assert len(runner.load_dataframe(results_dir, cache)) == len(full) - 12 + 5
+
+    replaced.unlink()
+    assert len(runner.load_dataframe(results_dir, cache)) == len(full) - 12
+
+    # another results directory does not reuse the cache
+    assert len(runner.load_dataframe(tmp_path / "other", cache)) == 0
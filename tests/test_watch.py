@@ -0,0 +1,76 @@
+import pytest
+import importlib
+import numpy as np
+import pandas as pd
+
+from tests.helpers import write_results_dir
+
+watch = importlib.import_module("results-analyzer.watch")
+results_analyzer = importlib.import_module("results-analyzer.results_analyzer")
+
+def test_running_stats_merge():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 2, size=1000)
+
+    running = watch.RunningStats()
+    for batch in np.array_split(values, 7):
+        running.update(batch)
+    running.update(np.array([np.nan]))
+
+    assert running.count == 1000
+    assert running.mean == pytest.approx(values.mean())
+    assert running.variance == pytest.approx(values.var(ddof=1))
+
+def test_histogram_sketch():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 2, size=10_000)
+
+    sketch = watch.HistogramSketch()
+    other = watch.HistogramSketch()
+    sketch.update(values[:5000])
+    other.update(values[5000:])
+    sketch.merge(other)
+
+    assert sketch.quantile(0.5) == pytest.approx(np.median(values), abs=0.01)
+    assert sketch.rank(1.5) == pytest.approx(np.mean(values <= 1.5), abs=0.01)
+
+def test_watcher_ingests_only_new_files(tmp_path):
+    results_dir = tmp_path / "results"
+    write_results_dir(results_dir, n_files=2, seed=0)
+
+    watcher = watch.ResultsWatcher(results_dir, tmp_path / "live", ["model", "jailbreak"], plots=False, settle_seconds=0)
+    assert watcher.poll() == 24
+    assert watcher.poll() == 0
+
+    # a second batch of files lands in the directory
+    new_dir = tmp_path / "new"
+    write_results_dir(new_dir, n_files=2, seed=1)
+    for file in new_dir.iterdir():
+        file.rename(results_dir / f"late_{file.name}")
+    assert watcher.poll() == 24
+
+    full = results_analyzer.initialize_dataframe_from_dir(results_dir)
+    summary = pd.read_csv(tmp_path / "live" / "summary.csv")
+    expected = full.groupby("jailbreak")["avg_dcs"].agg(["count", "mean", "std"])
+
+    rows = summary[(summary["groupby"] == "jailbreak") & (summary["metric"] == "avg_dcs")].set_index("level")
+    for level, row in expected.iterrows():
+        assert rows.loc[level, "n"] == row["count"]
+        assert rows.loc[level, "mean"] == pytest.approx(row["mean"])
+        assert rows.loc[level, "std"] == pytest.approx(row["std"])
+
+def test_watcher_retries_partial_files(tmp_path):
+    results_dir = tmp_path / "results"
+    write_results_dir(results_dir, n_files=2, seed=0)
+    complete = (results_dir / "results_1.json").read_text()
+    (results_dir / "results_1.json").write_text('{"results": [')
+
+    watcher = watch.ResultsWatcher(results_dir, tmp_path / "live", ["model", "jailbreak"], plots=False, settle_seconds=0)
+    assert watcher.poll() == 12
+    assert results_dir / "results_1.json" not in watcher.seen
+    # an unchanged file is not retried
+    assert watcher.poll() == 0
+
+    (results_dir / "results_1.json").write_text(complete)
+    assert watcher.poll() == 12
+    assert len(watcher.dataframe) == 24